@@ -1,16 +1,42 @@
+import asyncio
 import json
+import threading
 import time
+import uuid
+from dataclasses import dataclass
 
 from langchain.agents import create_agent
+from langchain.agents.middleware import ModelRequest, dynamic_prompt
 from langchain.chat_models import init_chat_model
 from langchain.tools import tool, ToolRuntime
-from langgraph.checkpoint.memory import InMemorySaver
-from langgraph.store.memory import InMemoryStore
 
-from config import GROQ_MODEL
-from tools.weather import get_weather
-from tools.places import search_places
-from supervisor import run_supervisor
+from langchain_core.messages import AIMessage, HumanMessage
+
+from config import (
+    GROQ_MODEL,
+    SUPERVISOR_MODE,
+    TOOL_MAX_CONCURRENCY,
+    CHECKPOINT_DURABILITY,
+    RESPONSE_CACHE_ENABLED,
+)
+from persistence import create_checkpointer, create_store
+from profiles import ProfileStore
+from response_cache import ResponseCache
+from middleware import (
+    HistoryCompactionMiddleware,
+    PromptAccountingMiddleware,
+    RateLimitMiddleware,
+    TelemetryMiddleware,
+    ToolConcurrencyMiddleware,
+    ToolSchemaCacheMiddleware,
+)
+from tools.weather import get_weather, compare_weather
+from tools.places import search_places, search_places_multi
+from tools.destinations import find_destinations
+from tools.results import coerce_result
+from telemetry import annotate, traced
+from supervisor import run_supervisor, arun_supervisor, submit_supervisor
+from usage import add_usage, empty_usage, supervisor_usage, tool_schema, turn_usage
 from logger import (
     log_user_message,
     log_tool_call,
@@ -18,6 +44,8 @@ from logger import (
     log_tool_error,
     log_llm_response,
     log_total_duration,
+    log_token_usage,
+    log_cache_hit,
     timer,
 )
 
@@ -29,12 +57,21 @@ interests, budget, and timing.
 ## Your Tools
 
 You have access to these tools:
+- **find_destinations**: Suggest destinations for an interest (beach, skiing, hiking, city, 
+  culture, food, nightlife, nature) in a month from a local index with climate averages. 
+  Use this first when the user hasn't chosen a destination.
 - **get_weather**: Check climate/weather data for a city in a specific month. Use this 
-  to verify if a destination has suitable weather for what the user wants.
+  to verify if a destination has suitable weather for what the user wants. The figures 
+  are from one model year, so don't present them as long-term averages.
+- **compare_weather**: Compare the climate of several candidate cities in one month as a 
+  single ranked table. Prefer this over several get_weather calls when choosing between 
+  destinations.
 - **search_places**: Search for attractions, restaurants, activities, and things to do 
   at a destination. Use this to find specific activities the user is interested in.
   IMPORTANT: Each call takes ONE category at a time (e.g. "beach", "restaurant", "museum").
-  If you need multiple categories, make separate calls for each one.
+- **search_places_multi**: Search several categories in one city with a single call 
+  (e.g. ["museum", "beach", "local food"]). Use this instead of several search_places 
+  calls when you need more than one category.
 - **save_user_preferences**: Save the user's travel preferences for future sessions.
 - **get_user_preferences**: Load previously saved preferences at the start of a conversation.
 
@@ -69,6 +106,8 @@ You have access to these tools:
    profile — it's not fabricated. Use it naturally for context when relevant.
 
 9. **Suggest relevant destinations**: Destinations MUST match what the user wants. 
+   - Get candidates from find_destinations rather than from memory whenever the interest 
+     is one it supports; it only returns cities that fit.
    - For beach trips: suggest coastal cities with actual beaches (e.g. Cancún, Phuket, 
      Dubrovnik, Faro, Crete, Bali). NEVER suggest landlocked cities like Budapest or Rome.
    - For skiing: suggest cities near ski resorts (e.g. Zermatt, Niseko, Bansko).
@@ -79,7 +118,12 @@ You have access to these tools:
     recommendations to the user. Say things like "Here are some great options I found" 
     or "I checked the weather for a few destinations — here's what looks good". 
     Don't reference the tools or data mechanically.
+"""
 
+# The only per-user part of the system prompt. It goes after SYSTEM_PROMPT so
+# that everything before it stays byte-identical across users and turns and
+# can be served from the provider's prompt cache.
+USER_PROMPT_TEMPLATE = """
 ## User's Home Location
 {home_location}
 
@@ -88,10 +132,17 @@ You have access to these tools:
 """
 
 
+@dataclass
+class TripContext:
+    """Per-invocation context, available to tools as runtime.context."""
+
+    user_id: str
+
+
 @tool
 def save_user_preferences(
     preferences: str,
-    runtime: ToolRuntime,
+    runtime: ToolRuntime[TripContext],
 ) -> str:
     """Save the user's travel preferences for future sessions.
 
@@ -103,73 +154,117 @@ def save_user_preferences(
         preferences: A JSON string describing the user's preferences.
             Example: '{"style": "adventure", "budget": "mid-range", "interests": ["hiking", "local food"]}'
     """
-    store = runtime.store
-    existing = store.get(("user",), "preferences")
-    existing_prefs = existing.value if existing else {}
-
     try:
         new_prefs = json.loads(preferences)
     except json.JSONDecodeError:
         new_prefs = {"raw": preferences}
+    if not isinstance(new_prefs, dict):
+        new_prefs = {"raw": new_prefs}
 
-    merged = {**existing_prefs, **new_prefs}
-    store.put(("user",), "preferences", merged)
+    merged = profiles.save_preferences(runtime.context.user_id, new_prefs)
     return f"Preferences saved: {json.dumps(merged)}"
 
 
 @tool
-def get_user_preferences(runtime: ToolRuntime) -> str:
+def get_user_preferences(runtime: ToolRuntime[TripContext]) -> str:
     """Load the user's previously saved travel preferences.
 
     Call this at the beginning of a new conversation to check if the user
     has any saved preferences from previous sessions.
     """
-    store = runtime.store
-    item = store.get(("user",), "preferences")
-    if item and item.value:
-        return f"Saved preferences: {json.dumps(item.value)}"
+    prefs = profiles.get_preferences(runtime.context.user_id)
+    if prefs:
+        return f"Saved preferences: {json.dumps(prefs)}"
     return "No saved preferences found."
 
 
-checkpointer = InMemorySaver()
-store = InMemoryStore()
+checkpointer = create_checkpointer()
+store = create_store()
+profiles = ProfileStore(store)
+response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
+
+ALL_TOOLS = [find_destinations, get_weather, compare_weather, search_places, search_places_multi, save_user_preferences, get_user_preferences]
+# Converted once here; every agent and model call reuses the same schema dicts.
+TOOL_SCHEMAS = [tool_schema(t) for t in ALL_TOOLS]
+
 
-ALL_TOOLS = [get_weather, search_places, save_user_preferences, get_user_preferences]
+_agent = None
+_agent_lock = threading.Lock()
 
 
-def create_trip_agent(home_location: str = "Not set yet"):
-    """Create and return the trip planning agent."""
-    prefs_item = store.get(("user",), "preferences")
-    prefs_str = json.dumps(prefs_item.value) if prefs_item and prefs_item.value else "None saved yet"
+def build_system_prompt(user_id: str) -> str:
+    """System prompt with the user's home location and saved preferences filled in."""
+    home = profiles.get_home_location(user_id)
+    home_str = f"{home['name']}, {home['country']}" if home else "Not set yet"
+    prefs = profiles.get_preferences(user_id)
+    prefs_str = json.dumps(prefs) if prefs else "None saved yet"
 
-    prompt = SYSTEM_PROMPT.format(
-        home_location=home_location,
+    return SYSTEM_PROMPT + USER_PROMPT_TEMPLATE.format(
+        home_location=home_str,
         user_preferences=prefs_str,
     )
 
-    model = init_chat_model(GROQ_MODEL, model_provider="groq", temperature=0.7)
 
-    agent = create_agent(
+@dynamic_prompt
+def _personalized_prompt(request: ModelRequest) -> str:
+    # Rebuilt on every model call, so saved preferences apply from the next step on.
+    return build_system_prompt(request.runtime.context.user_id)
+
+
+def create_trip_agent(model=None):
+    """Compile a new trip planning agent graph.
+
+    Per-user data is not baked in: the system prompt is filled from the
+    profile store at call time, using the user_id in the invoke context.
+    `model` replaces the Groq chat model (e.g. a scripted one for benchmarks).
+    """
+    if model is None:
+        # Retries are left to RateLimitMiddleware, which shares limits with the supervisor.
+        model = init_chat_model(GROQ_MODEL, model_provider="groq", temperature=0.7, max_retries=0)
+
+    return create_agent(
         model=model,
         tools=ALL_TOOLS,
-        system_prompt=prompt,
+        middleware=[
+            HistoryCompactionMiddleware(),
+            _personalized_prompt,
+            ToolSchemaCacheMiddleware(),
+            PromptAccountingMiddleware(static_prefix=SYSTEM_PROMPT),
+            RateLimitMiddleware(),
+            ToolConcurrencyMiddleware(),
+            TelemetryMiddleware(),
+        ],
+        context_schema=TripContext,
         checkpointer=checkpointer,
         store=store,
     )
-    return agent
 
 
-def _extract_new_messages(all_messages: list, user_content: str) -> list:
-    """Extract only the messages from the current turn (after the last matching user message)."""
+def get_trip_agent():
+    """The process-wide agent, compiled on first use and shared by every session."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = create_trip_agent()
+    return _agent
+
+
+def _user_turn(content: str) -> HumanMessage:
+    """The human message that starts a turn, with an id to find it again in the result."""
+    return HumanMessage(content, id=uuid.uuid4().hex)
+
+
+def _extract_new_messages(all_messages: list, message_id: str) -> list:
+    """Messages produced in the current turn, i.e. after the human message with `message_id`."""
     for i in range(len(all_messages) - 1, -1, -1):
-        msg = all_messages[i]
-        if getattr(msg, "type", None) == "human" and msg.content == user_content:
+        if all_messages[i].id == message_id:
             return all_messages[i + 1:]
     return all_messages
 
 
 def _build_tool_input_map(messages: list) -> dict:
-    """Build a map from tool_call_id to tool input args from AI messages."""
+    """Build a map from tool_call_id to tool input args and call order from AI messages."""
     tc_map = {}
     for msg in messages:
         if getattr(msg, "type", None) == "ai" and hasattr(msg, "tool_calls"):
@@ -178,118 +273,438 @@ def _build_tool_input_map(messages: list) -> dict:
                 tc_map[tc_id] = {
                     "name": tc.get("name", "unknown"),
                     "args": tc.get("args", {}),
+                    "index": len(tc_map),
                 }
     return tc_map
 
 
-def invoke_agent(agent, user_message: str, thread_id: str = "default") -> dict:
-    """Invoke the agent with logging and supervisor validation.
+def _ordered_tool_messages(messages: list, tc_map: dict) -> list:
+    """Tool results in the order the model requested them, regardless of completion order."""
+    tool_msgs = [m for m in messages if getattr(m, "type", None) == "tool"]
+    return sorted(
+        tool_msgs,
+        key=lambda m: tc_map.get(getattr(m, "tool_call_id", ""), {}).get("index", len(tc_map)),
+    )
 
-    Returns dict with: response (str), tool_calls (list), supervisor (dict)
-    """
-    request_start = time.perf_counter()
-    log_user_message(user_message)
 
-    config = {"configurable": {"thread_id": thread_id}}
+def _run_config(thread_id: str) -> dict:
+    return {
+        "configurable": {"thread_id": thread_id},
+        "max_concurrency": TOOL_MAX_CONCURRENCY,
+    }
 
-    try:
-        with timer() as agent_timer:
-            result = agent.invoke(
-                {"messages": [{"role": "user", "content": user_message}]},
-                config=config,
-            )
-    except Exception as e:
-        error_msg = str(e)
-        from logger import log_tool_error
-        log_tool_error("agent", error_msg)
-        if "rate_limit" in error_msg.lower() or "429" in error_msg:
-            return {
-                "response": "I've hit the API rate limit. Please wait a minute and try again.",
-                "tool_calls": [],
-                "supervisor": {"passed": True, "verdict": "SKIP", "reason": "Rate limited"},
-            }
-        if "tool_use_failed" in error_msg.lower() or "failed_generation" in error_msg.lower():
-            return {
-                "response": "I had trouble processing that request. Could you try rephrasing it, or ask about one thing at a time? For example, instead of 'what can I do there?' try 'find me restaurants in Dubai'.",
-                "tool_calls": [],
-                "supervisor": {"passed": True, "verdict": "SKIP", "reason": "Tool call format error"},
-            }
+
+def _error_result(e: Exception) -> dict:
+    """Map an agent failure to a user-facing result dict."""
+    error_msg = str(e)
+    log_tool_error("agent", error_msg)
+    if "rate_limit" in error_msg.lower() or "429" in error_msg:
         return {
-            "response": f"Sorry, something went wrong: {error_msg[:200]}",
+            "response": "I've hit the API rate limit. Please wait a minute and try again.",
             "tool_calls": [],
-            "supervisor": {"passed": True, "verdict": "SKIP", "reason": "Error"},
+            "supervisor": {"passed": True, "verdict": "SKIP", "reason": "Rate limited"},
+            "usage": empty_usage(),
         }
+    if "tool_use_failed" in error_msg.lower() or "failed_generation" in error_msg.lower():
+        return {
+            "response": "I had trouble processing that request. Could you try rephrasing it, or ask about one thing at a time? For example, instead of 'what can I do there?' try 'find me restaurants in Dubai'.",
+            "tool_calls": [],
+            "supervisor": {"passed": True, "verdict": "SKIP", "reason": "Tool call format error"},
+            "usage": empty_usage(),
+        }
+    return {
+        "response": f"Sorry, something went wrong: {error_msg[:200]}",
+        "tool_calls": [],
+        "supervisor": {"passed": True, "verdict": "SKIP", "reason": "Error"},
+        "usage": empty_usage(),
+    }
 
+
+def _collect_turn(result: dict, message_id: str) -> tuple[list[dict], str, dict]:
+    """Pull the tool call log, final AI text and token usage for the current turn out of an agent result.
+
+    Each tool call entry has: name, input (args dict), output (text the model saw)
+    and data (the structured result from tools.results, or None).
+    """
     all_messages = result.get("messages", [])
-    new_messages = _extract_new_messages(all_messages, user_message)
+    new_messages = _extract_new_messages(all_messages, message_id)
 
     tc_map = _build_tool_input_map(new_messages)
 
     tool_calls_log = []
-    agent_response = ""
+    for msg in _ordered_tool_messages(new_messages, tc_map):
+        tool_call_id = getattr(msg, "tool_call_id", "")
+        tool_name = getattr(msg, "name", "unknown")
+        tool_output = msg.content
 
-    for msg in new_messages:
-        msg_type = getattr(msg, "type", None)
+        tc_info = tc_map.get(tool_call_id, {})
+        tool_args = tc_info.get("args", {})
 
-        if msg_type == "tool":
-            tool_call_id = getattr(msg, "tool_call_id", "")
-            tool_name = getattr(msg, "name", "unknown")
-            tool_output = msg.content
+        log_tool_call(tool_name, tool_args)
+        log_tool_result(tool_name, tool_output, msg.response_metadata.get("duration_ms", 0))
 
-            tc_info = tc_map.get(tool_call_id, {})
-            tool_args = tc_info.get("args", {})
+        tool_calls_log.append({
+            "name": tool_name,
+            "input": tool_args,
+            "output": tool_output,
+            "data": coerce_result(tool_name, getattr(msg, "artifact", None)),
+        })
 
-            log_tool_call(tool_name, tool_args)
-            log_tool_result(tool_name, tool_output, 0)
+    agent_response = _last_ai_text(new_messages)
+    return tool_calls_log, agent_response, turn_usage(new_messages)
 
-            tool_calls_log.append({
-                "name": tool_name,
-                "input": json.dumps(tool_args),
-                "output": tool_output,
-            })
 
-    for msg in reversed(new_messages):
+def _last_ai_text(messages: list) -> str:
+    for msg in reversed(messages):
         if getattr(msg, "type", None) == "ai" and msg.content:
-            agent_response = msg.content
-            break
-
-    log_llm_response(agent_response, agent_timer["elapsed_ms"])
-
-    home_item = store.get(("user",), "home_location")
-    home_ctx = f"Home: {home_item.value}" if home_item and home_item.value else ""
-    prefs_item = store.get(("user",), "preferences")
-    prefs_ctx = f"Preferences: {prefs_item.value}" if prefs_item and prefs_item.value else ""
-    user_context = f"{home_ctx}\n{prefs_ctx}".strip()
-
-    supervisor_result = run_supervisor(user_message, tool_calls_log, agent_response, user_context)
-
-    if not supervisor_result["passed"]:
-        retry_message = (
-            f"Your previous response was flagged by the supervisor: "
-            f"{supervisor_result['reason']}. "
-            f"Please regenerate your response using ONLY data from the tools. "
-            f"Do not fabricate any information."
-        )
-        with timer() as retry_timer:
-            retry_result = agent.invoke(
-                {"messages": [{"role": "user", "content": retry_message}]},
-                config=config,
-            )
+            return msg.content
+    return ""
+
+
+def _user_context(user_id: str) -> str:
+    """Known user facts the supervisor must not treat as fabricated."""
+    home = profiles.get_home_location(user_id)
+    home_ctx = f"Home: {home}" if home else ""
+    prefs = profiles.get_preferences(user_id)
+    prefs_ctx = f"Preferences: {prefs}" if prefs else ""
+    return f"{home_ctx}\n{prefs_ctx}".strip()
+
+
+def _cache_partition(user_id: str) -> str:
+    """Users with the same home and preferences may share cached answers."""
+    return json.dumps(
+        {"home": profiles.get_home_location(user_id), "prefs": profiles.get_preferences(user_id)},
+        sort_keys=True,
+        default=str,
+    )
+
+
+def _cacheable(agent, config: dict) -> bool:
+    """Only a thread's opening question is answered from, or stored in, the response cache."""
+    return response_cache is not None and not agent.get_state(config).values.get("messages")
+
+
+def _cached_turn(agent, user_message: str, config: dict, user_id: str) -> dict | None:
+    """Answer from the response cache and record the exchange in the thread, or None on a miss."""
+    hit = response_cache.lookup(user_message, _cache_partition(user_id))
+    if hit is None:
+        return None
+    result, score = hit
+    log_cache_hit(score)
+    # Seed the thread so follow-up questions see this exchange as history.
+    agent.update_state(
+        config,
+        {"messages": [HumanMessage(user_message), AIMessage(result["response"])]},
+        as_node="model",
+    )
+    return {**result, "usage": empty_usage(), "cached": True}
 
-        retry_messages = retry_result.get("messages", [])
-        for msg in reversed(retry_messages):
-            if getattr(msg, "type", None) == "ai" and msg.content:
-                agent_response = msg.content
-                break
 
-        log_llm_response(agent_response, retry_timer["elapsed_ms"])
-        supervisor_result = {"passed": True, "verdict": "PASS", "reason": "After retry"}
+def _remember_turn(user_message: str, user_id: str, result: dict):
+    """Cache a first-turn result if the supervisor verified it."""
+    if result["supervisor"].get("verdict") == "PASS":
+        response_cache.store(user_message, _cache_partition(user_id), result)
 
-    total_ms = (time.perf_counter() - request_start) * 1000
-    log_total_duration(total_ms)
 
+def _retry_message(supervisor_result: dict) -> str:
+    return (
+        f"Your previous response was flagged by the supervisor: "
+        f"{supervisor_result['reason']}. "
+        f"Please regenerate your response using ONLY data from the tools. "
+        f"Do not fabricate any information."
+    )
+
+
+def _begin_turn(user_message: str, thread_id: str, user_id: str) -> tuple[float, dict, TripContext]:
+    """(start time, run config, invoke context) for a new turn, logged and traced."""
+    request_start = time.perf_counter()
+    log_user_message(user_message)
+    annotate(thread_id=thread_id)
+    return request_start, _run_config(thread_id), TripContext(user_id=user_id)
+
+
+def _agent_input(message: HumanMessage, config: dict, context: TripContext) -> dict:
+    """Arguments for one agent run (invoke, ainvoke or stream) on `message`."""
     return {
+        "input": {"messages": [message]},
+        "config": config,
+        "context": context,
+        "durability": CHECKPOINT_DURABILITY,
+    }
+
+
+def _finish_turn(
+    user_message: str,
+    user_id: str,
+    cacheable: bool,
+    turn: tuple[list[dict], str, dict],
+    request_start: float,
+    background: bool = False,
+):
+    """Everything after the agent's first answer: supervisor, response cache, regeneration, usage and logs.
+
+    Shared by invoke_agent, ainvoke_agent and stream_agent, which only differ
+    in how they run the supervisor and the agent. This is a generator that
+    yields what it needs done and is sent the outcome:
+      - ("supervise", args): the verdict of run_supervisor(*args)
+      - ("retry", message): the new messages of an agent run on `message`
+    It returns the turn result. With background=True the supervisor is
+    submitted instead: the verdict is PENDING, the result carries
+    supervisor_future, and a flagged answer is reported but not regenerated.
+    """
+    tool_calls_log, agent_response, usage = turn
+    supervisor_args = (user_message, tool_calls_log, agent_response, _user_context(user_id))
+    future = None
+
+    if background:
+        future = submit_supervisor(*supervisor_args)
+        if cacheable:
+            checked = {"response": agent_response, "tool_calls": tool_calls_log}
+            future.add_done_callback(
+                lambda f: _remember_turn(user_message, user_id, {**checked, "supervisor": f.result()})
+            )
+        supervisor_result = {"passed": True, "verdict": "PENDING", "reason": "Checking in background"}
+    else:
+        supervisor_result = yield ("supervise", supervisor_args)
+        usage = add_usage(usage, supervisor_usage(supervisor_result))
+        if cacheable:
+            _remember_turn(user_message, user_id, {
+                "response": agent_response,
+                "tool_calls": tool_calls_log,
+                "supervisor": supervisor_result,
+            })
+
+        if not supervisor_result["passed"]:
+            retry_message = _user_turn(_retry_message(supervisor_result))
+            with timer() as retry_timer:
+                retry_messages = yield ("retry", retry_message)
+            agent_response = _last_ai_text(retry_messages) or agent_response
+            usage = add_usage(usage, turn_usage(retry_messages))
+            log_llm_response(agent_response, retry_timer["elapsed_ms"])
+            supervisor_result = {"passed": True, "verdict": "PASS", "reason": "After retry"}
+
+    log_token_usage(usage)
+    log_total_duration((time.perf_counter() - request_start) * 1000)
+
+    result = {
         "response": agent_response,
         "tool_calls": tool_calls_log,
         "supervisor": supervisor_result,
+        "usage": usage,
     }
+    if future is not None:
+        result["supervisor_future"] = future
+    return result
+
+
+def _drive(steps, supervise, retry) -> dict:
+    """Run a _finish_turn() generator with blocking supervisor and agent calls."""
+    try:
+        kind, arg = next(steps)
+        while True:
+            try:
+                outcome = supervise(*arg) if kind == "supervise" else retry(arg)
+            except Exception as e:
+                steps.close()
+                return _error_result(e)
+            kind, arg = steps.send(outcome)
+    except StopIteration as done:
+        return done.value
+
+
+async def _adrive(steps, supervise, retry) -> dict:
+    """Async variant of _drive(): `supervise` and `retry` are coroutine functions."""
+    try:
+        kind, arg = next(steps)
+        while True:
+            try:
+                outcome = await (supervise(*arg) if kind == "supervise" else retry(arg))
+            except Exception as e:
+                steps.close()
+                return _error_result(e)
+            kind, arg = steps.send(outcome)
+    except StopIteration as done:
+        return done.value
+
+
+@traced("turn")
+def invoke_agent(agent, user_message: str, thread_id: str = "default", user_id: str = "default") -> dict:
+    """Invoke the agent with logging and supervisor validation.
+
+    Returns dict with: response (str), tool_calls (list), supervisor (dict) and
+    usage (dict, see usage.py). With SUPERVISOR_MODE="background" the supervisor verdict is PENDING and the
+    dict also carries supervisor_future, which resolves to the real verdict;
+    usage then leaves out the supervisor call.
+    Answers served from the response cache carry cached=True.
+    """
+    request_start, config, context = _begin_turn(user_message, thread_id, user_id)
+
+    cacheable = _cacheable(agent, config)
+    if cacheable and (cached := _cached_turn(agent, user_message, config, user_id)):
+        log_total_duration((time.perf_counter() - request_start) * 1000)
+        return cached
+
+    message = _user_turn(user_message)
+    try:
+        with timer() as agent_timer:
+            result = agent.invoke(**_agent_input(message, config, context))
+    except Exception as e:
+        return _error_result(e)
+
+    turn = _collect_turn(result, message.id)
+    log_llm_response(turn[1], agent_timer["elapsed_ms"])
+
+    def retry(retry_message):
+        retry_result = agent.invoke(**_agent_input(retry_message, config, context))
+        return _extract_new_messages(retry_result.get("messages", []), retry_message.id)
+
+    steps = _finish_turn(
+        user_message, user_id, cacheable, turn, request_start, background=SUPERVISOR_MODE == "background"
+    )
+    return _drive(steps, run_supervisor, retry)
+
+
+def _stream_turn(agent, message: HumanMessage, config: dict, context: TripContext):
+    """Yield token and tool events for one agent run as they arrive."""
+    for mode, data in agent.stream(
+        {"messages": [message]},
+        config=config,
+        context=context,
+        stream_mode=["messages", "updates"],
+        durability=CHECKPOINT_DURABILITY,
+    ):
+        if mode == "messages":
+            chunk, metadata = data
+            if (
+                metadata.get("langgraph_node") == "model"
+                and getattr(chunk, "type", None) in ("ai", "AIMessageChunk")
+                and isinstance(chunk.content, str)
+                and chunk.content
+            ):
+                yield {"type": "token", "content": chunk.content}
+            continue
+
+        # Only report what the model and tools produce, not middleware rewrites of the history.
+        for node, update in data.items():
+            if node not in ("model", "tools"):
+                continue
+            for msg in (update or {}).get("messages", []):
+                msg_type = getattr(msg, "type", None)
+                if msg_type == "ai":
+                    for tc in (msg.tool_calls or []):
+                        yield {
+                            "type": "tool_call",
+                            "id": tc.get("id", ""),
+                            "name": tc.get("name", "unknown"),
+                            "args": tc.get("args", {}),
+                        }
+                elif msg_type == "tool":
+                    yield {
+                        "type": "tool_result",
+                        "id": getattr(msg, "tool_call_id", ""),
+                        "name": getattr(msg, "name", "unknown"),
+                        "output": msg.content,
+                    }
+
+
+@traced("turn")
+def stream_agent(agent, user_message: str, thread_id: str = "default", user_id: str = "default"):
+    """Streaming variant of invoke_agent().
+
+    Yields event dicts as the turn progresses:
+      - {"type": "token", "content"}: a piece of model output text
+      - {"type": "tool_call", "id", "name", "args"}: the model requested a tool
+      - {"type": "tool_result", "id", "name", "output"}: a tool finished
+      - {"type": "response", "content"}: the complete answer; the supervisor is
+        already running while the consumer renders it
+      - {"type": "supervisor", "supervisor"}: verdict on the streamed response
+      - {"type": "retry", "reason"}: the response was flagged and is being regenerated;
+        tokens that follow replace what was streamed so far
+      - {"type": "done", "result"}: the same dict invoke_agent() returns; always last
+    """
+    request_start, config, context = _begin_turn(user_message, thread_id, user_id)
+
+    cacheable = _cacheable(agent, config)
+    if cacheable and (cached := _cached_turn(agent, user_message, config, user_id)):
+        log_total_duration((time.perf_counter() - request_start) * 1000)
+        yield {"type": "response", "content": cached["response"]}
+        yield {"type": "supervisor", "supervisor": cached["supervisor"]}
+        yield {"type": "done", "result": cached}
+        return
+
+    message = _user_turn(user_message)
+    try:
+        with timer() as agent_timer:
+            yield from _stream_turn(agent, message, config, context)
+    except Exception as e:
+        yield {"type": "done", "result": _error_result(e)}
+        return
+
+    turn = _collect_turn(agent.get_state(config).values, message.id)
+    log_llm_response(turn[1], agent_timer["elapsed_ms"])
+
+    # The supervisor always runs in the background here, overlapping with the
+    # consumer rendering the response, and the stream waits for its verdict.
+    steps = _finish_turn(user_message, user_id, cacheable, turn, request_start)
+    retried = False
+    try:
+        kind, arg = next(steps)
+        while True:
+            if kind == "supervise":
+                future = submit_supervisor(*arg)
+                yield {"type": "response", "content": arg[2]}
+                outcome = future.result()
+                yield {"type": "supervisor", "supervisor": outcome}
+                if not outcome["passed"]:
+                    yield {"type": "retry", "reason": outcome["reason"]}
+            else:
+                retried = True
+                try:
+                    yield from _stream_turn(agent, arg, config, context)
+                except Exception as e:
+                    steps.close()
+                    yield {"type": "done", "result": _error_result(e)}
+                    return
+                outcome = _extract_new_messages(agent.get_state(config).values.get("messages", []), arg.id)
+            kind, arg = steps.send(outcome)
+    except StopIteration as done:
+        result = done.value
+
+    if retried:
+        yield {"type": "supervisor", "supervisor": result["supervisor"]}
+    yield {"type": "done", "result": result}
+
+
+@traced("turn")
+async def ainvoke_agent(agent, user_message: str, thread_id: str = "default", user_id: str = "default") -> dict:
+    """Async variant of invoke_agent(). Tools and the supervisor run without blocking the loop.
+
+    Returns the same dict as invoke_agent(), including supervisor_future with
+    SUPERVISOR_MODE="background". Needs a checkpointer and store with async
+    support (the "memory" backends); the sqlite and postgres ones are sync-only.
+    """
+    request_start, config, context = _begin_turn(user_message, thread_id, user_id)
+
+    cacheable = await asyncio.to_thread(_cacheable, agent, config)
+    if cacheable and (cached := await asyncio.to_thread(_cached_turn, agent, user_message, config, user_id)):
+        log_total_duration((time.perf_counter() - request_start) * 1000)
+        return cached
+
+    message = _user_turn(user_message)
+    try:
+        with timer() as agent_timer:
+            result = await agent.ainvoke(**_agent_input(message, config, context))
+    except Exception as e:
+        return _error_result(e)
+
+    turn = _collect_turn(result, message.id)
+    log_llm_response(turn[1], agent_timer["elapsed_ms"])
+
+    async def retry(retry_message):
+        retry_result = await agent.ainvoke(**_agent_input(retry_message, config, context))
+        return _extract_new_messages(retry_result.get("messages", []), retry_message.id)
+
+    steps = _finish_turn(
+        user_message, user_id, cacheable, turn, request_start, background=SUPERVISOR_MODE == "background"
+    )
+    return await _adrive(steps, arun_supervisor, retry)
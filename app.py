@@ -1,8 +1,9 @@
 import uuid
 import streamlit as st
 
-from agent import create_trip_agent, invoke_agent, store
+from agent import get_trip_agent, stream_agent, profiles
 from tools.weather import validate_city
+from ui.components import render_streaming_response
 from ui.styles import CUSTOM_CSS
 
 from logger import setup_logging
@@ -20,14 +21,18 @@ st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 
 def _init_session():
+    if "user_id" not in st.session_state:
+        # Kept in the URL (?user=...) so a reload or bookmark finds the same profile.
+        if "user" not in st.query_params:
+            st.query_params["user"] = str(uuid.uuid4())
+        st.session_state.user_id = st.query_params["user"]
     if "home_location" not in st.session_state:
-        st.session_state.home_location = None
+        # A returning user skips onboarding.
+        st.session_state.home_location = profiles.get_home_location(st.session_state.user_id)
     if "messages" not in st.session_state:
         st.session_state.messages = []
     if "thread_id" not in st.session_state:
         st.session_state.thread_id = str(uuid.uuid4())
-    if "agent" not in st.session_state:
-        st.session_state.agent = None
 
 
 _init_session()
@@ -70,9 +75,7 @@ def _render_onboarding():
                     )
                 else:
                     st.session_state.home_location = result
-                    home_str = f"{result['name']}, {result['country']}"
-                    st.session_state.agent = create_trip_agent(home_str)
-                    store.put(("user",), "home_location", result)
+                    profiles.set_home_location(st.session_state.user_id, result)
                     st.rerun()
 
 
@@ -116,14 +119,14 @@ def _render_chat():
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                result = invoke_agent(
-                    st.session_state.agent,
+            result = render_streaming_response(
+                stream_agent(
+                    get_trip_agent(),
                     prompt,
                     st.session_state.thread_id,
+                    st.session_state.user_id,
                 )
-
-            st.markdown(result["response"])
+            )
 
         st.session_state.messages.append({
             "role": "assistant",
@@ -136,8 +139,4 @@ def _render_chat():
 if st.session_state.home_location is None:
     _render_onboarding()
 else:
-    if st.session_state.agent is None:
-        loc = st.session_state.home_location
-        home_str = f"{loc['name']}, {loc['country']}"
-        st.session_state.agent = create_trip_agent(home_str)
     _render_chat()
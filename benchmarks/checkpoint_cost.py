@@ -0,0 +1,88 @@
+"""Per-turn checkpoint write cost as a conversation grows.
+
+Runs one long conversation per backend through a tool-free agent with a
+scripted model, and times every checkpointer write.
+
+    python -m benchmarks.checkpoint_cost --turns 200 --backends memory sqlite
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from langchain.agents import create_agent
+from langchain_core.messages import AIMessage
+
+import persistence
+from benchmarks.fakes import ScriptedChatModel
+
+REPLY = AIMessage(content="Lisbon in May averages 19.5°C with little rain. " * 8)
+REPORT_AT = (1, 10, 25, 50, 100, 200, 500, 1000)
+
+
+def _instrument(saver, totals: dict):
+    """Accumulate time spent in the saver's write methods into `totals`."""
+    for name in ("put", "put_writes"):
+        original = getattr(saver, name)
+
+        def timed(*args, _original=original, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            finally:
+                totals["ms"] += (time.perf_counter() - start) * 1000
+                totals["calls"] += 1
+
+        setattr(saver, name, timed)
+
+
+def run(backend: str, turns: int, durability: str) -> list[dict]:
+    saver = persistence.create_checkpointer(backend)
+    totals = {"ms": 0.0, "calls": 0}
+    _instrument(saver, totals)
+
+    agent = create_agent(ScriptedChatModel(responses=[REPLY]), tools=[], checkpointer=saver)
+    config = {"configurable": {"thread_id": f"bench-{backend}"}}
+
+    rows = []
+    for turn in range(1, turns + 1):
+        totals["ms"], totals["calls"] = 0.0, 0
+        start = time.perf_counter()
+        agent.invoke(
+            {"messages": [{"role": "user", "content": f"Question {turn}: where is warm in May?"}]},
+            config=config,
+            durability=durability,
+        )
+        turn_ms = (time.perf_counter() - start) * 1000
+        if turn in REPORT_AT or turn == turns:
+            rows.append({
+                "turn": turn,
+                "messages": turn * 2,
+                "write_ms": totals["ms"],
+                "writes": totals["calls"],
+                "turn_ms": turn_ms,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    parser.add_argument("--durability", default="exit", choices=["exit", "async", "sync"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        persistence.SQLITE_DB_PATH = os.path.join(tmp, "bench.sqlite3")
+        for backend in args.backends:
+            print(f"\n{backend} (durability={args.durability})")
+            print(f"{'turn':>6} {'msgs':>6} {'writes':>7} {'write ms':>9} {'turn ms':>8}")
+            for row in run(backend, args.turns, args.durability):
+                print(
+                    f"{row['turn']:>6} {row['messages']:>6} {row['writes']:>7} "
+                    f"{row['write_ms']:>9.2f} {row['turn_ms']:>8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
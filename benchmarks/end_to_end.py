@@ -0,0 +1,207 @@
+"""End-to-end invoke_agent latency, allocations and throughput, fully offline.
+
+Replays the recorded scenarios in benchmarks/fixtures/scenarios.json through
+the real agent graph, middleware, tools and supervisor. The agent and
+supervisor models are scripted, and the tools talk to a local stub server
+(benchmarks/stub_server.py) instead of Open-Meteo and Foursquare. Latency of
+the model and the APIs can be simulated.
+
+    python -m benchmarks.end_to_end --iterations 20 --model-latency-ms 300 --api-latency-ms 80
+    python -m benchmarks.end_to_end --scenarios weather compare --json .data/bench.json
+
+Per scenario it reports turn latency percentiles, throughput, model calls,
+HTTP requests and tool errors per turn, prompt bytes sent per turn with the
+share that is the static, cacheable prefix, and peak/retained traced memory
+per iteration. It also prints the per-stage p50/p95 from telemetry.stage_stats().
+Upstream caches are cleared before every iteration unless --warm-cache is given.
+"""
+import os
+
+# Offline defaults, set before config is imported. Rate limits are lifted so
+# the scheduler does not pace a scripted model; export GROQ_RPM/GROQ_TPM to
+# benchmark them too.
+os.environ.setdefault("GROQ_RPM", "1000000")
+os.environ.setdefault("GROQ_TPM", "1000000000")
+os.environ.setdefault("TRIP_AGENT_CONSOLE_LOG", "0")
+os.environ.setdefault("TRIP_AGENT_TRACE_SAMPLE", "0")
+os.environ.setdefault("TRIP_AGENT_CACHE_DB", "")
+
+import argparse  # noqa: E402
+import gc  # noqa: E402
+import itertools  # noqa: E402
+import json  # noqa: E402
+import time  # noqa: E402
+import tracemalloc  # noqa: E402
+import uuid  # noqa: E402
+
+from langchain_core.messages import AIMessage  # noqa: E402
+
+import agent  # noqa: E402
+import supervisor  # noqa: E402
+import tools.places  # noqa: E402
+import tools.weather  # noqa: E402
+from benchmarks.fakes import ScriptedChatModel, last_tool_results  # noqa: E402
+from benchmarks.stub_server import FIXTURES, StubServer  # noqa: E402
+from history import estimate_tokens  # noqa: E402
+from telemetry import _percentile, reset_stats, stage_stats  # noqa: E402
+from tools.results import ToolError  # noqa: E402
+
+
+def load_scenarios() -> dict:
+    with open(os.path.join(FIXTURES, "scenarios.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _respond(step: dict, call_ids, latency_ms: float, prefill_ms_per_1k: float):
+    def respond(messages):
+        time.sleep((latency_ms + estimate_tokens(messages) / 1000 * prefill_ms_per_1k) / 1000)
+        if "tool_calls" in step:
+            return AIMessage("", tool_calls=[
+                {"name": call["name"], "args": call["args"], "id": f"call-{next(call_ids)}"}
+                for call in step["tool_calls"]
+            ])
+        return AIMessage(step["content"].replace("{tool_results}", last_tool_results(messages)))
+
+    return respond
+
+
+def _script(spec: dict, latency_ms: float, prefill_ms_per_1k: float):
+    """(user messages, agent model, supervisor model) for one pass over a scenario."""
+    turns = spec["turns"] * spec.get("repeat", 1)
+    call_ids = itertools.count()
+    steps = [_respond(step, call_ids, latency_ms, prefill_ms_per_1k) for turn in turns for step in turn["model"]]
+    verdicts = [AIMessage(v) for turn in turns for v in turn.get("supervisor", [])]
+    return (
+        [turn["user"] for turn in turns],
+        ScriptedChatModel(responses=steps),
+        ScriptedChatModel(responses=verdicts or [AIMessage("VERDICT: PASS\nREASON: grounded")]),
+    )
+
+
+def _clear_caches():
+    for cache in (tools.weather._geocode_cache, tools.weather._climate_cache, tools.places._places_cache):
+        cache.clear()
+
+
+def _run_once(graph, users: list[str], cold: bool, turn_ms: list | None = None, prompt_sizes: list | None = None) -> int:
+    """One pass over a scenario in a fresh thread. Returns the number of tool errors.
+
+    Appends each turn's latency to `turn_ms` and its (prompt bytes, static
+    prefix bytes) to `prompt_sizes` when given.
+    """
+    if cold:
+        _clear_caches()
+    thread_id = f"bench-{uuid.uuid4().hex}"
+    errors = 0
+    for user_message in users:
+        start = time.perf_counter()
+        result = agent.invoke_agent(graph, user_message, thread_id=thread_id, user_id="bench")
+        if turn_ms is not None:
+            turn_ms.append((time.perf_counter() - start) * 1000)
+        if prompt_sizes is not None:
+            prompt_sizes.append((result["usage"]["prompt_bytes"], result["usage"]["static_prompt_bytes"]))
+        # Failed turns come back from agent._error_result with a SKIP verdict.
+        errors += result["supervisor"].get("verdict") == "SKIP"
+        errors += sum(isinstance(t["data"], ToolError) for t in result["tool_calls"])
+    return errors
+
+
+def run(spec: dict, server: StubServer, iterations: int, cold: bool,
+        model_latency_ms: float, prefill_ms_per_1k: float) -> dict:
+    users, model, supervisor_model = _script(spec, model_latency_ms, prefill_ms_per_1k)
+    graph = agent.create_trip_agent(model)
+    supervisor._supervisor_model = supervisor_model
+
+    # Warm-up pass: imports, compiled schemas, pooled connections.
+    _run_once(graph, users, cold)
+
+    reset_stats()
+    turn_ms, prompt_sizes, errors = [], [], 0
+    requests_before, calls_before = server.total_requests(), model.cursor
+    start = time.perf_counter()
+    for _ in range(iterations):
+        errors += _run_once(graph, users, cold, turn_ms, prompt_sizes)
+    wall_s = time.perf_counter() - start
+    turns = len(turn_ms)
+    stages = stage_stats()
+    model_calls = model.cursor - calls_before
+    http_requests = server.total_requests() - requests_before
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    _run_once(graph, users, cold)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    turn_ms.sort()
+    return {
+        "turns": turns,
+        "p50_ms": round(_percentile(turn_ms, 50), 2),
+        "p95_ms": round(_percentile(turn_ms, 95), 2),
+        "max_ms": round(turn_ms[-1], 2),
+        "turns_per_s": round(turns / wall_s, 2),
+        "model_calls_per_turn": round(model_calls / turns, 2),
+        "http_requests_per_turn": round(http_requests / turns, 2),
+        "tool_errors": errors,
+        "prompt_kib_per_turn": round(sum(b for b, _ in prompt_sizes) / 1024 / turns, 1),
+        "static_prefix_share": round(sum(s for _, s in prompt_sizes) / max(sum(b for b, _ in prompt_sizes), 1), 3),
+        "peak_kib": round((peak - baseline) / 1024, 1),
+        "retained_kib": round((retained - baseline) / 1024, 1),
+        "stages": stages,
+    }
+
+
+def main():
+    scenarios = load_scenarios()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=list(scenarios), choices=list(scenarios))
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--model-latency-ms", type=float, default=0.0,
+                        help="simulated fixed latency per model call")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=0.0,
+                        help="simulated model latency per 1k prompt tokens")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0,
+                        help="simulated latency per upstream HTTP request")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="keep geocoding/climate/places caches between iterations")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with StubServer(latency_ms=args.api_latency_ms) as server:
+        server.patch_tools()
+        for name in args.scenarios:
+            results[name] = run(
+                scenarios[name], server, args.iterations, not args.warm_cache,
+                args.model_latency_ms, args.prefill_ms_per_1k,
+            )
+
+    print(f"\n{'scenario':<18} {'turns':>6} {'p50 ms':>8} {'p95 ms':>8} {'turns/s':>8} "
+          f"{'llm/turn':>9} {'http/turn':>10} {'errors':>7} {'prompt KiB':>11} {'static':>7} "
+          f"{'peak KiB':>9} {'kept KiB':>9}")
+    for name, r in results.items():
+        print(
+            f"{name:<18} {r['turns']:>6} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['turns_per_s']:>8.2f} "
+            f"{r['model_calls_per_turn']:>9.2f} {r['http_requests_per_turn']:>10.2f} {r['tool_errors']:>7} "
+            f"{r['prompt_kib_per_turn']:>11.1f} {r['static_prefix_share']:>7.0%} "
+            f"{r['peak_kib']:>9.1f} {r['retained_kib']:>9.1f}"
+        )
+
+    for name, r in results.items():
+        print(f"\n{name}: stages")
+        print(f"  {'stage':<28} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for stage, s in r["stages"].items():
+            print(f"  {stage:<28} {s['count']:>6} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['max_ms']:>8.2f}")
+
+    if args.json:
+        directory = os.path.dirname(args.json)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Offline stand-ins for the Groq chat model, used by the benchmarks."""
+import asyncio
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that replays a fixed list of AI messages in order, looping at the end.
+
+    Entries may also be callables taking the prompt messages and returning an
+    AIMessage, for responses that depend on the conversation. `latency_ms`
+    simulates the provider's response time (awaited, not slept, when called
+    asynchronously).
+    """
+
+    responses: list[Any]
+    cursor: int = 0
+    latency_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _next(self, messages) -> AIMessage:
+        response = self.responses[self.cursor % len(self.responses)]
+        self.cursor += 1
+        if callable(response):
+            response = response(messages)
+        return response.model_copy()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._next(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._next(messages))])
+
+
+def last_tool_results(messages) -> str:
+    """Content of the most recent group of tool messages in a prompt."""
+    results = []
+    for msg in reversed(messages):
+        if msg.type == "tool":
+            results.append(msg.content)
+        elif results:
+            break
+    return "\n".join(reversed(results))
@@ -0,0 +1,93 @@
+"""Prompt size and per-turn latency as a conversation grows, with and without history compaction.
+
+Every turn makes one weather tool call and then answers, so the history grows
+the way a real session does. The scripted model sleeps for a simulated prefill
+cost proportional to the prompt it receives.
+
+    python -m benchmarks.history_growth --turns 100 --prefill-ms-per-1k 20
+"""
+import argparse
+import time
+
+from langchain.agents import create_agent
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+
+from benchmarks.fakes import ScriptedChatModel
+from history import estimate_tokens
+from middleware import HistoryCompactionMiddleware
+from tools.results import WeatherResult, render
+
+REPORT_AT = (1, 5, 10, 25, 50, 100, 200, 500)
+WEATHER = WeatherResult("Lisbon", "Portugal", 5, 19.5, 24.1, 14.9, 38.2, 0.0)
+
+
+@tool(response_format="content_and_artifact")
+def get_weather(city: str, month: int):
+    """Climate data for a city in a month."""
+    return render(WEATHER) + "Source: ERA5 daily reanalysis, 2024.\n" * 6, WEATHER
+
+
+def _scripted_model(prompt_tokens: list, prefill_ms_per_1k: float) -> ScriptedChatModel:
+    def respond(messages):
+        tokens = estimate_tokens(messages)
+        prompt_tokens.append(tokens)
+        time.sleep(tokens / 1000 * prefill_ms_per_1k / 1000)
+        if messages[-1].type == "tool":
+            return AIMessage("Lisbon in May averages 19.5°C, max 24.1°C, with 38.2 mm of rain. " * 3)
+        return AIMessage(
+            "",
+            tool_calls=[{"name": "get_weather", "args": {"city": "Lisbon", "month": 5}, "id": f"call-{len(messages)}"}],
+        )
+
+    return ScriptedChatModel(responses=[respond])
+
+
+def run(turns: int, compact: bool, prefill_ms_per_1k: float) -> list[dict]:
+    prompt_tokens = []
+    agent = create_agent(
+        _scripted_model(prompt_tokens, prefill_ms_per_1k),
+        tools=[get_weather],
+        middleware=[HistoryCompactionMiddleware()] if compact else [],
+        checkpointer=InMemorySaver(),
+    )
+    config = {"configurable": {"thread_id": "bench"}}
+
+    rows = []
+    for turn in range(1, turns + 1):
+        start = time.perf_counter()
+        result = agent.invoke(
+            {"messages": [{"role": "user", "content": f"Question {turn}: how warm is Lisbon in May?"}]},
+            config=config,
+        )
+        turn_ms = (time.perf_counter() - start) * 1000
+        if turn in REPORT_AT or turn == turns:
+            rows.append({
+                "turn": turn,
+                "messages": len(result["messages"]),
+                "prompt_tokens": prompt_tokens[-1],
+                "turn_ms": turn_ms,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=20.0,
+                        help="simulated model latency per 1k prompt tokens")
+    args = parser.parse_args()
+
+    for compact in (False, True):
+        print(f"\n{'compacted' if compact else 'full history'}")
+        print(f"{'turn':>6} {'msgs':>6} {'prompt tok':>11} {'turn ms':>8}")
+        for row in run(args.turns, compact, args.prefill_ms_per_1k):
+            print(
+                f"{row['turn']:>6} {row['messages']:>6} "
+                f"{row['prompt_tokens']:>11} {row['turn_ms']:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
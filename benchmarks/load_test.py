@@ -0,0 +1,376 @@
+"""Concurrent sessions against one process: throughput, latency, memory and lock contention.
+
+Drives --users simulated users, each in its own thread_id/user_id, through
+invoke_agent (one worker thread per user) or ainvoke_agent (--mode async, one
+task per user on a single event loop). Every user alternates a weather
+question about a different city with a small-talk turn. The chat models are
+scripted with a simulated latency, and the tools call the local stub server
+from benchmarks/stub_server.py.
+
+    python -m benchmarks.load_test --users 50 --turns 6 --model-latency-ms 400 --api-latency-ms 80
+    python -m benchmarks.load_test --users 200 --mode async
+
+Besides throughput and latency percentiles it reports traced memory retained
+per session, and wait time on the process-wide locks and on the per-run tool
+semaphores of ToolConcurrencyMiddleware. It then checks that shared module
+state held up under concurrency:
+- lazy singletons are created once;
+- no session sees another's data;
+- shared counters add up.
+It exits non-zero if a check fails.
+"""
+import os
+
+# Offline defaults, set before config is imported (see benchmarks/end_to_end.py).
+os.environ.setdefault("GROQ_RPM", "1000000")
+os.environ.setdefault("GROQ_TPM", "1000000000")
+os.environ.setdefault("TRIP_AGENT_CONSOLE_LOG", "0")
+os.environ.setdefault("TRIP_AGENT_TRACE_SAMPLE", "0")
+os.environ.setdefault("TRIP_AGENT_CACHE_DB", "")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import gc  # noqa: E402
+import random  # noqa: E402
+import re  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+import tracemalloc  # noqa: E402
+from concurrent.futures import ThreadPoolExecutor  # noqa: E402
+
+from langchain_core.messages import AIMessage  # noqa: E402
+
+import agent  # noqa: E402
+import supervisor  # noqa: E402
+import telemetry  # noqa: E402
+import tools.places  # noqa: E402
+import tools.weather  # noqa: E402
+from benchmarks.fakes import ScriptedChatModel, last_tool_results  # noqa: E402
+from benchmarks.stub_server import StubServer  # noqa: E402
+from config import TOOL_CONCURRENCY_LIMITS  # noqa: E402
+from middleware import ToolConcurrencyMiddleware  # noqa: E402
+from scheduler import scheduler  # noqa: E402
+from telemetry import _percentile, reset_stats, stage_stats  # noqa: E402
+from tools.results import MONTH_NAMES  # noqa: E402
+from tools.singleflight import singleflight_stats  # noqa: E402
+
+_QUESTION = re.compile(r"How warm is (?P<city>.+), (?P<country>.+) in (?P<month>\w+)\?")
+
+
+class LockWaits:
+    """How often a lock, or every semaphore of one kind, was acquired and how long acquirers waited."""
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, waited_ms: float | None = None):
+        """One acquisition; `waited_ms` is None when it didn't have to wait."""
+        with self._lock:
+            self.acquisitions += 1
+            if waited_ms is not None:
+                self.contended += 1
+                self.wait_ms += waited_ms
+                self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+
+
+class TimedLock:
+    """Drop-in for threading.Lock (or a threading semaphore) that records how long acquirers had to wait."""
+
+    def __init__(self, lock=None, waits: LockWaits | None = None):
+        self._lock = lock or threading.Lock()
+        self.waits = waits or LockWaits()
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self.waits.record()
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        self.waits.record((time.perf_counter() - start) * 1000)
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class TimedAsyncSemaphore:
+    """The asyncio.Semaphore counterpart of TimedLock."""
+
+    def __init__(self, semaphore: asyncio.Semaphore, waits: LockWaits):
+        self._semaphore = semaphore
+        self.waits = waits
+
+    async def acquire(self):
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            self.waits.record()
+            return True
+        start = time.perf_counter()
+        await self._semaphore.acquire()
+        self.waits.record((time.perf_counter() - start) * 1000)
+        return True
+
+    def release(self):
+        self._semaphore.release()
+
+
+def _probed_tool_concurrency(waits: dict[str, LockWaits]) -> type:
+    """ToolConcurrencyMiddleware whose per-run semaphores all record into `waits`, by tool."""
+
+    class ProbedToolConcurrencyMiddleware(ToolConcurrencyMiddleware):
+        def _new_semaphore(self, name):
+            return TimedLock(super()._new_semaphore(name), waits[name])
+
+        def _new_async_semaphore(self, name):
+            return TimedAsyncSemaphore(super()._new_async_semaphore(name), waits[name])
+
+    return ProbedToolConcurrencyMiddleware
+
+
+def _instrument_locks() -> dict[str, LockWaits]:
+    """Swap the locks and semaphores on the request path for timed ones. Call before create_trip_agent()."""
+    locks = {}
+
+    def swap(name, owner, attr):
+        timed = TimedLock(getattr(owner, attr))
+        setattr(owner, attr, timed)
+        locks[name] = timed.waits
+
+    swap("telemetry.stats", telemetry, "_stats_lock")
+    swap("supervisor.model", supervisor, "_supervisor_model_lock")
+    for name, cache in (
+        ("geocode", tools.weather._geocode_cache),
+        ("climate", tools.weather._climate_cache),
+        ("places", tools.places._places_cache),
+    ):
+        swap(f"cache.{name}.lru", cache._memory, "_lock")
+        swap(f"cache.{name}.stats", cache, "_stats_lock")
+    # The dispatcher thread is started lazily, so the condition can still be replaced.
+    scheduler_lock = TimedLock()
+    scheduler._cond = threading.Condition(scheduler_lock)
+    locks["scheduler"] = scheduler_lock.waits
+    # The tool semaphores are made per run, so every one made for a tool shares its row.
+    tool_waits = {name: LockWaits() for name in TOOL_CONCURRENCY_LIMITS}
+    locks.update((f"tool.{name}", waits) for name, waits in tool_waits.items())
+    agent.ToolConcurrencyMiddleware = _probed_tool_concurrency(tool_waits)
+    return locks
+
+
+def _agent_model(latency_ms: float) -> ScriptedChatModel:
+    """Stateless scripted agent model, safe to share between concurrent sessions."""
+    def respond(messages):
+        last = messages[-1]
+        if last.type == "tool":
+            return AIMessage(f"Here's what I found:\n{last_tool_results(messages)}")
+        question = _QUESTION.match(last.content)
+        if question is None:
+            return AIMessage("Pack layers for the evenings and book popular sights ahead. Enjoy!")
+        return AIMessage("", tool_calls=[{
+            "name": "get_weather",
+            "args": {
+                "city": question["city"],
+                "country": question["country"],
+                "month": MONTH_NAMES.index(question["month"]),
+            },
+            "id": f"call-{len(messages)}",
+        }])
+
+    return ScriptedChatModel(responses=[respond], latency_ms=latency_ms)
+
+
+def _user_plan(user: int, turns: int, destinations: list[dict], same_city: bool = False) -> dict:
+    rng = random.Random(user)
+    entry = destinations[0] if same_city else rng.choice(destinations)
+    month = MONTH_NAMES[rng.randint(1, 12)]
+    messages = [
+        f"How warm is {entry['city']}, {entry['country']} in {month}?" if turn % 2 == 0
+        else "Thanks! Anything else I should know?"
+        for turn in range(turns)
+    ]
+    return {"thread_id": f"load-{user}", "user_id": f"user-{user}", "city": entry["city"], "messages": messages}
+
+
+def _record(plan: dict, result: dict, elapsed_ms: float):
+    plan["latencies"].append(elapsed_ms)
+    plan["responses"].append(result["response"])
+
+
+def _run_user(graph, plan: dict):
+    for message in plan["messages"]:
+        start = time.perf_counter()
+        result = agent.invoke_agent(graph, message, thread_id=plan["thread_id"], user_id=plan["user_id"])
+        _record(plan, result, (time.perf_counter() - start) * 1000)
+
+
+async def _arun_user(graph, plan: dict):
+    for message in plan["messages"]:
+        start = time.perf_counter()
+        result = await agent.ainvoke_agent(graph, message, thread_id=plan["thread_id"], user_id=plan["user_id"])
+        _record(plan, result, (time.perf_counter() - start) * 1000)
+
+
+def _check_singletons(threads: int = 16) -> list[str]:
+    """Race the lazily created process-wide objects; each must be built exactly once."""
+    failures = []
+    cases = (
+        ("supervisor._get_model", supervisor, "init_chat_model", "_supervisor_model", supervisor._get_model),
+        ("agent.get_trip_agent", agent, "create_trip_agent", "_agent", agent.get_trip_agent),
+    )
+    for name, module, factory_name, attr, getter in cases:
+        created = []
+
+        def slow_factory(*args, **kwargs):
+            time.sleep(0.01)
+            created.append(object())
+            return created[-1]
+
+        original_factory, original_value = getattr(module, factory_name), getattr(module, attr)
+        setattr(module, factory_name, slow_factory)
+        setattr(module, attr, None)
+        barrier = threading.Barrier(threads)
+
+        def race():
+            barrier.wait()
+            return getter()
+
+        try:
+            with ThreadPoolExecutor(threads) as pool:
+                instances = {id(i) for i in pool.map(lambda _: race(), range(threads))}
+        finally:
+            setattr(module, factory_name, original_factory)
+            setattr(module, attr, original_value)
+        if len(created) != 1 or len(instances) != 1:
+            failures.append(f"{name} created {len(created)} instances under {threads} concurrent callers")
+    return failures
+
+
+def _check_sessions(graph, plans: list[dict]) -> list[str]:
+    """Every session's answers and checkpointed history must be its own."""
+    failures = []
+    for plan in plans:
+        history = graph.get_state({"configurable": {"thread_id": plan["thread_id"]}}).values["messages"]
+        humans = [m for m in history if m.type == "human"]
+        tool_outputs = [m.content for m in history if m.type == "tool"]
+        if len(humans) != len(plan["messages"]):
+            failures.append(f"{plan['thread_id']}: {len(humans)} user messages stored, expected {len(plan['messages'])}")
+        if any(plan["city"] not in output for output in tool_outputs):
+            failures.append(f"{plan['thread_id']}: tool results for another city in history")
+        if any(plan["city"] not in r for r in plan["responses"][::2]):
+            failures.append(f"{plan['thread_id']}: weather answer does not mention {plan['city']}")
+    return failures
+
+
+def _check_counters(plans: list[dict], model_calls: int) -> list[str]:
+    failures = []
+    turns = sum(len(p["latencies"]) for p in plans)
+    recorded = stage_stats().get("turn", {}).get("count", 0)
+    if recorded != turns:
+        failures.append(f"telemetry recorded {recorded} turns, expected {turns}")
+    granted = scheduler.stats()["granted"]
+    if granted != model_calls:
+        failures.append(f"scheduler granted {granted} model calls, agent made {model_calls}")
+    return failures
+
+
+def _drive(graph, plans: list[dict], mode: str) -> float:
+    """Run every plan concurrently; returns the wall time in seconds."""
+    for plan in plans:
+        plan["latencies"], plan["responses"] = [], []
+    start = time.perf_counter()
+    if mode == "threads":
+        with ThreadPoolExecutor(max_workers=len(plans)) as pool:
+            list(pool.map(lambda plan: _run_user(graph, plan), plans))
+    else:
+        async def run_all():
+            await asyncio.gather(*(_arun_user(graph, plan) for plan in plans))
+        asyncio.run(run_all())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=6, help="turns per user")
+    parser.add_argument("--mode", choices=["threads", "async"], default="threads")
+    parser.add_argument("--model-latency-ms", type=float, default=400.0)
+    parser.add_argument("--api-latency-ms", type=float, default=80.0)
+    parser.add_argument("--memory-users", type=int, default=10,
+                        help="sessions in the separate traced pass that measures memory")
+    parser.add_argument("--same-city", action="store_true",
+                        help="every user asks about the same city (a traffic spike on one destination)")
+    args = parser.parse_args()
+
+    locks = _instrument_locks()
+    model = _agent_model(args.model_latency_ms)
+    graph = agent.create_trip_agent(model)
+    supervisor._supervisor_model = ScriptedChatModel(responses=[AIMessage("VERDICT: PASS\nREASON: grounded")])
+
+    with StubServer(latency_ms=args.api_latency_ms) as server:
+        server.patch_tools()
+        plans = [_user_plan(u, args.turns, server.destinations, args.same_city) for u in range(args.users)]
+        reset_stats()
+        wall_s = _drive(graph, plans, args.mode)
+        http_requests, model_calls = server.total_requests(), model.cursor
+        coalesced = singleflight_stats()
+        stages = stage_stats()
+        failures = _check_counters(plans, model_calls) + _check_sessions(graph, plans)
+
+        # tracemalloc slows every allocation down several times, so memory is
+        # measured on fresh sessions after the timed pass instead of during it.
+        memory_plans = [
+            _user_plan(u, args.turns, server.destinations)
+            for u in range(args.users, args.users + args.memory_users)
+        ]
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        _drive(graph, memory_plans, args.mode)
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    latencies = sorted(ms for plan in plans for ms in plan["latencies"])
+    turns = len(latencies)
+    print(f"\n{args.users} users × {args.turns} turns ({args.mode}), "
+          f"model {args.model_latency_ms:.0f} ms, API {args.api_latency_ms:.0f} ms")
+    print(f"  throughput      {turns / wall_s:8.2f} turns/s  ({turns} turns in {wall_s:.2f} s)")
+    print(f"  turn latency    p50 {_percentile(latencies, 50):.1f} ms   p95 {_percentile(latencies, 95):.1f} ms   "
+          f"p99 {_percentile(latencies, 99):.1f} ms   max {latencies[-1]:.1f} ms")
+    print(f"  model calls     {model_calls}   HTTP requests {http_requests}   coalesced lookups "
+          + ", ".join(f"{name} {s['coalesced']}" for name, s in coalesced.items()))
+    print(f"  memory          {(retained - baseline) / 1024 / args.memory_users:8.1f} KiB retained per session   "
+          f"peak {(peak - baseline) / 1024 / 1024:.1f} MiB  ({args.memory_users} traced sessions)")
+
+    print(f"\n  {'lock':<26} {'acquired':>9} {'contended':>10} {'wait ms':>9} {'max ms':>8}")
+    for name, waits in locks.items():
+        print(f"  {name:<26} {waits.acquisitions:>9} {waits.contended:>10} {waits.wait_ms:>9.2f} {waits.max_wait_ms:>8.2f}")
+
+    print(f"\n  {'stage':<26} {'count':>9} {'p50 ms':>10} {'p95 ms':>9} {'max ms':>8}")
+    for stage, s in stages.items():
+        print(f"  {stage:<26} {s['count']:>9} {s['p50_ms']:>10.2f} {s['p95_ms']:>9.2f} {s['max_ms']:>8.2f}")
+
+    failures += _check_singletons()
+    print("\nShared state checks:", "PASS" if not failures else "FAIL")
+    for failure in failures[:20]:
+        print(f"  - {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Local stand-in for the Open-Meteo and Foursquare APIs, used by the benchmarks.
+
+Geocoding and climate answers are built from the destination index
+(data/destinations.json): every day of a month gets that month's normals.
+Foursquare answers replay benchmarks/fixtures/places.json by query.
+
+    with StubServer(latency_ms=50) as server:
+        server.patch_tools()
+        ...
+        server.requests  # {"/v1/search": 3, "/v1/climate": 1, ...}
+"""
+import calendar
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from config import DESTINATIONS_PATH
+from tools.cache import normalize_key
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _load_destinations() -> list[dict]:
+    with open(DESTINATIONS_PATH, encoding="utf-8") as f:
+        return json.load(f)["destinations"]
+
+
+def _load_places() -> dict:
+    with open(os.path.join(FIXTURES, "places.json"), encoding="utf-8") as f:
+        return {normalize_key(query): results for query, results in json.load(f).items()}
+
+
+def _daily_series(entry: dict, start: date, end: date) -> dict:
+    daily = {key: [] for key in ("time", "temperature_2m_mean", "temperature_2m_max",
+                                 "temperature_2m_min", "precipitation_sum", "snowfall_sum")}
+    day = start
+    while day <= end:
+        month = day.month - 1
+        days_in_month = calendar.monthrange(day.year, day.month)[1]
+        mean = entry["temp"][month]
+        rain = entry["precip"][month] / days_in_month
+        daily["time"].append(day.isoformat())
+        daily["temperature_2m_mean"].append(mean)
+        daily["temperature_2m_max"].append(round(mean + 5 - day.day % 3, 1))
+        daily["temperature_2m_min"].append(round(mean - 5 + day.day % 3, 1))
+        daily["precipitation_sum"].append(round(rain, 2))
+        daily["snowfall_sum"].append(round(rain * 0.7, 2) if mean < 1 else 0.0)
+        day += timedelta(days=1)
+    return daily
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; don't let Nagle hold the body back.
+    disable_nagle_algorithm = True
+    server: "StubServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.count(url.path)
+        time.sleep(self.server.latency_ms / 1000)
+
+        if url.path == "/v1/search":
+            body = self.server.geocode(params.get("name", ""))
+        elif url.path == "/v1/climate":
+            body = self.server.climate(params)
+        elif url.path == "/places/search":
+            body = {"results": self.server.places.get(normalize_key(params.get("query")), [])}
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency_ms: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency_ms = latency_ms
+        self.destinations = _load_destinations()
+        self.places = _load_places()
+        self.requests: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._by_name = {normalize_key(d["city"]): d for d in self.destinations}
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, path: str):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def total_requests(self) -> int:
+        with self._lock:
+            return sum(self.requests.values())
+
+    def geocode(self, name: str) -> dict:
+        entry = self._by_name.get(normalize_key(name))
+        if entry is None:
+            return {}
+        return {"results": [{
+            "name": entry["city"],
+            "country": entry["country"],
+            "latitude": entry["lat"],
+            "longitude": entry["lon"],
+        }]}
+
+    def _nearest(self, lat: float, lon: float) -> dict:
+        return min(self.destinations, key=lambda d: (d["lat"] - lat) ** 2 + (d["lon"] - lon) ** 2)
+
+    def climate(self, params: dict):
+        start = date.fromisoformat(params["start_date"])
+        end = date.fromisoformat(params["end_date"])
+        coords = zip(params["latitude"].split(","), params["longitude"].split(","))
+        locations = [
+            {"daily": _daily_series(self._nearest(float(lat), float(lon)), start, end)}
+            for lat, lon in coords
+        ]
+        return locations if len(locations) > 1 else locations[0]
+
+    def patch_tools(self):
+        """Point the tools at this server instead of the real APIs."""
+        import tools.places
+        import tools.weather
+
+        tools.weather.OPEN_METEO_GEOCODING_URL = f"{self.url}/v1/search"
+        tools.weather.CLIMATE_API_URL = f"{self.url}/v1/climate"
+        tools.places.FOURSQUARE_BASE_URL = f"{self.url}/places/search"
+        tools.places.FOURSQUARE_API_KEY = tools.places.FOURSQUARE_API_KEY or "benchmark"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -11,3 +11,137 @@ FOURSQUARE_API_KEY = os.getenv("FOURSQUARE_API_KEY")
 OPEN_METEO_BASE_URL = "https://api.open-meteo.com/v1"
 OPEN_METEO_GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
 FOURSQUARE_BASE_URL = "https://places-api.foursquare.com/places/search"
+
+CACHE_DB_PATH = os.getenv("TRIP_AGENT_CACHE_DB", ".cache/trip_agent.sqlite3")
+
+GEOCODE_CACHE_SIZE = 2048
+GEOCODE_CACHE_TTL = 30 * 24 * 3600
+GEOCODE_NEGATIVE_CACHE_TTL = 24 * 3600
+
+# get_weather and compare_weather summarize this one year of the climate model's
+# daily series: a single model year, not multi-year normals.
+CLIMATE_YEAR = 2024
+# Monthly summaries are stored per grid cell of this size (degrees) and month.
+CLIMATE_GRID_DEG = 0.1
+CLIMATE_CACHE_SIZE = 4096
+CLIMATE_CACHE_TTL = 180 * 24 * 3600
+# Most cities one compare_weather call will look up; extra ones are ignored.
+COMPARE_MAX_CITIES = 8
+
+# Local destination index (coordinates, tags, monthly climate normals) used by find_destinations.
+DESTINATIONS_PATH = os.getenv(
+    "TRIP_AGENT_DESTINATIONS", os.path.join(os.path.dirname(__file__), "data", "destinations.json")
+)
+# Most destinations one find_destinations call returns.
+DESTINATIONS_MAX_RESULTS = 10
+
+# Foursquare results are cached per category and location, with coordinates
+# rounded to PLACES_CACHE_DECIMALS (2 ≈ 1 km).
+PLACES_CACHE_SIZE = 2048
+PLACES_CACHE_TTL = 7 * 24 * 3600
+PLACES_CACHE_DECIMALS = 2
+# Most categories one search_places_multi call will search; extra ones are ignored.
+PLACES_MAX_CATEGORIES = 5
+
+# Tool calls emitted in one model step run concurrently, at most this many at a time.
+TOOL_MAX_CONCURRENCY = 8
+# Per-tool ceilings within one run, on top of TOOL_MAX_CONCURRENCY, so one fan-out
+# can't flood an upstream API. Runs don't share them; see HTTP_MAX_CONNECTIONS_PER_HOST.
+TOOL_CONCURRENCY_LIMITS = {
+    "get_weather": 4,
+    "compare_weather": 2,
+    "search_places": 3,
+    "search_places_multi": 2,
+}
+
+# Shared keep-alive HTTP pool used by all tools.
+HTTP_MAX_CONNECTIONS = 50
+HTTP_MAX_CONNECTIONS_PER_HOST = 10
+HTTP_KEEPALIVE_EXPIRY = 30
+
+# Latency budget (seconds) per upstream for one logical request, retries and
+# hedges included. Hosts not listed get HTTP_DEFAULT_BUDGET.
+HTTP_ENDPOINT_BUDGETS = {
+    "geocoding-api.open-meteo.com": 4.0,
+    "climate-api.open-meteo.com": 12.0,
+    "places-api.foursquare.com": 6.0,
+}
+HTTP_DEFAULT_BUDGET = 10.0
+HTTP_MAX_RETRIES = 2
+HTTP_RETRY_BACKOFF = 0.25
+# Send a second copy of a GET to these hosts if the first hasn't answered after
+# this many seconds, and use whichever returns first.
+HTTP_HEDGE_AFTER = {
+    "geocoding-api.open-meteo.com": 1.0,
+    "places-api.foursquare.com": 2.0,
+}
+# A host's circuit opens after this many consecutive failures and lets a trial
+# request through again after HTTP_BREAKER_RESET seconds.
+HTTP_BREAKER_FAILURES = 5
+HTTP_BREAKER_RESET = 30.0
+
+# "blocking": invoke_agent waits for the supervisor and regenerates flagged answers.
+# "background": invoke_agent returns immediately with a pending verdict and a
+# "supervisor_future"; flagged answers are reported but not regenerated.
+SUPERVISOR_MODE = os.getenv("SUPERVISOR_MODE", "blocking")
+
+# "llm": always ask the supervisor model.
+# "rules": deterministic numeric grounding only, no LLM call.
+# "hybrid": rules first, the LLM only when some figure can't be matched.
+SUPERVISOR_ENGINE = os.getenv("SUPERVISOR_ENGINE", "hybrid")
+# Extra slack (in °C / mm / cm) on top of the rounding a claim's decimals imply.
+GROUNDING_TOLERANCE = 0.1
+
+# Chat history (checkpointer) and preferences (store) backends: "memory", "sqlite" or "postgres".
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "memory")
+STORE_BACKEND = os.getenv("STORE_BACKEND", "memory")
+SQLITE_DB_PATH = os.getenv("TRIP_AGENT_DB", ".data/trip_agent.sqlite3")
+SQLITE_BUSY_TIMEOUT_MS = 5000
+POSTGRES_URL = os.getenv("POSTGRES_URL")
+POSTGRES_POOL_SIZE = 10
+# "exit" persists one checkpoint per turn instead of one per graph step.
+# Use "sync" if a crash mid-turn must not lose the partial turn.
+CHECKPOINT_DURABILITY = os.getenv("CHECKPOINT_DURABILITY", "exit")
+
+# Read-through cache in front of the per-user profile store.
+PROFILE_CACHE_SIZE = 10_000
+PROFILE_CACHE_TTL = 300
+# Keys not set yet are re-read soon, so e.g. a home location saved by another worker shows up quickly.
+PROFILE_NEGATIVE_CACHE_TTL = 5
+
+# Opt-in cache of first-turn answers, matched by query similarity. See response_cache.py.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "0") == "1"
+RESPONSE_CACHE_SIZE = 500
+RESPONSE_CACHE_TTL = 6 * 3600
+RESPONSE_CACHE_THRESHOLD = 0.8
+
+# Conversation history sent to the model is compacted past this many tokens
+# (estimated as chars / 4); the last HISTORY_KEEP_TURNS turns are kept verbatim.
+HISTORY_TOKEN_BUDGET = 4000
+HISTORY_KEEP_TURNS = 3
+
+# Headless API server (server.py). Workers are separate processes, so more than
+# one needs a shared CHECKPOINT_BACKEND/STORE_BACKEND (sqlite or postgres).
+SERVER_HOST = os.getenv("TRIP_AGENT_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("TRIP_AGENT_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("TRIP_AGENT_WORKERS", "1"))
+
+# Colored request logs on the terminal; turn off in production.
+LOG_CONSOLE = os.getenv("TRIP_AGENT_CONSOLE_LOG", "1") == "1"
+
+# Tracing spans (telemetry.py). Durations of the last TELEMETRY_WINDOW spans per
+# stage are kept for percentiles; a sampled share of traces is written as JSON
+# lines to TELEMETRY_PATH when it is set.
+TELEMETRY_PATH = os.getenv("TRIP_AGENT_TRACE_FILE")
+TELEMETRY_SAMPLE_RATE = float(os.getenv("TRIP_AGENT_TRACE_SAMPLE", "0.1"))
+TELEMETRY_WINDOW = 2048
+
+# Client-side limits for Groq calls, shared by the agent and the supervisor
+# (free tier for llama-3.1-8b-instant: 30 requests and 6000 tokens per minute).
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "6000"))
+# Tokens reserved for a call's completion until its real usage is known.
+LLM_COMPLETION_ALLOWANCE = 300
+LLM_MAX_RETRIES = 5
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_MAX = 30.0
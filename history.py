@@ -0,0 +1,136 @@
+"""Keep the conversation sent to the model within a token budget.
+
+The checkpointer keeps every message of a thread, so without this each turn
+would resend the whole session. Once the history is over budget:
+
+1. Tool outputs from older turns are collapsed into one-line digests
+   (render_compact); the typed artifact stays on the message.
+2. If that is not enough, the oldest turns are dropped and folded into a
+   short "earlier conversation" note: each user question and the start of
+   the answer it got.
+
+The most recent turns are never touched, and a turn is only ever dropped
+whole, so an AI tool call is never separated from its tool results.
+Tokens are estimated as characters / 4, which is close enough for budgeting.
+"""
+from langchain_core.messages import HumanMessage, RemoveMessage, ToolMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from config import HISTORY_TOKEN_BUDGET, HISTORY_KEEP_TURNS
+from tools.results import coerce_result, render_compact
+
+DIGEST_ID = "history-digest"
+DIGEST_HEADER = "[Summary of the earlier conversation]"
+_CHARS_PER_TOKEN = 4
+_TOOL_DIGEST_CHARS = 300
+_ANSWER_PREVIEW_CHARS = 200
+_MAX_DIGEST_LINES = 40
+
+
+def _text(msg) -> str:
+    content = msg.content
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def estimate_tokens(messages: list) -> int:
+    """Rough token count of a message list, including tool call arguments."""
+    chars = 0
+    for msg in messages:
+        chars += len(_text(msg))
+        for tc in getattr(msg, "tool_calls", None) or []:
+            chars += len(tc.get("name", "")) + len(str(tc.get("args", {})))
+    return chars // _CHARS_PER_TOKEN
+
+
+def _split_turns(messages: list) -> tuple[list, list[list]]:
+    """(leading messages, turns); each turn starts at a human message."""
+    prefix, turns = [], []
+    for msg in messages:
+        if msg.type == "human" and msg.id != DIGEST_ID:
+            turns.append([msg])
+        elif turns:
+            turns[-1].append(msg)
+        else:
+            prefix.append(msg)
+    return prefix, turns
+
+
+def _tool_digest(msg: ToolMessage) -> ToolMessage:
+    text = _text(msg)
+    if len(text) <= _TOOL_DIGEST_CHARS:
+        return msg
+    result = coerce_result(msg.name, msg.artifact)
+    try:
+        digest = render_compact(result) if result is not None else None
+    except TypeError:
+        digest = None
+    if digest is None:
+        digest = text[:_TOOL_DIGEST_CHARS] + "..."
+    return msg.model_copy(update={"content": digest})
+
+
+def _turn_summary(turn: list) -> str:
+    question = _text(turn[0])
+    answer = ""
+    for msg in reversed(turn):
+        if msg.type == "ai" and _text(msg):
+            answer = _text(msg)
+            break
+    if len(answer) > _ANSWER_PREVIEW_CHARS:
+        answer = answer[:_ANSWER_PREVIEW_CHARS] + "..."
+    line = f"- User: {question}"
+    return f"{line}\n  Assistant: {answer}" if answer else line
+
+
+def _digest_message(prefix: list, dropped: list[list]) -> HumanMessage:
+    lines = []
+    for msg in prefix:
+        if msg.id == DIGEST_ID:
+            lines.extend(_text(msg).splitlines()[1:])
+    for turn in dropped:
+        lines.extend(_turn_summary(turn).splitlines())
+    lines = lines[-_MAX_DIGEST_LINES:]
+    while lines and not lines[0].startswith("- "):
+        lines.pop(0)
+    return HumanMessage("\n".join([DIGEST_HEADER, *lines]), id=DIGEST_ID)
+
+
+def compact_messages(
+    messages: list,
+    budget: int = HISTORY_TOKEN_BUDGET,
+    keep_turns: int = HISTORY_KEEP_TURNS,
+) -> dict | None:
+    """The state update that brings `messages` within `budget`, or None if nothing changes."""
+    if estimate_tokens(messages) <= budget:
+        return None
+
+    prefix, turns = _split_turns(messages)
+    if len(turns) <= keep_turns:
+        return None
+    older, recent = turns[:-keep_turns], turns[-keep_turns:]
+
+    changed = False
+    digested = []
+    for turn in older:
+        new_turn = [_tool_digest(m) if isinstance(m, ToolMessage) else m for m in turn]
+        changed = changed or any(a is not b for a, b in zip(turn, new_turn))
+        digested.append(new_turn)
+    older = digested
+
+    tokens = estimate_tokens(prefix) + sum(estimate_tokens(t) for t in older + recent)
+    dropped = []
+    while older and tokens > budget:
+        turn = older.pop(0)
+        tokens -= estimate_tokens(turn)
+        dropped.append(turn)
+
+    if dropped:
+        others = [m for m in prefix if m.id != DIGEST_ID]
+        prefix = [_digest_message(prefix, dropped), *others]
+    elif not changed:
+        return None
+
+    kept = [*prefix, *(m for turn in older + recent for m in turn)]
+    return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *kept]}
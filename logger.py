@@ -1,7 +1,21 @@
+"""Terminal logging for the request path.
+
+The log_* functions only create a record holding the raw values. Records
+pass through a queue to a background listener thread, and the colored,
+multi-line console text is rendered there, so neither formatting nor
+terminal I/O adds to a request's latency. Set TRIP_AGENT_CONSOLE_LOG=0 to
+turn the console output off entirely.
+"""
+import atexit
 import json
-import time
 import logging
+import queue
+import time
 from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+from config import LOG_CONSOLE
+from usage import prefix_cache_hit_rate
 
 logger = logging.getLogger("trip_agent")
 
@@ -19,68 +33,199 @@ _COLORS = {
     "RESET": "\033[0m",
 }
 
+_listeners: list[QueueListener] = []
+
 
 def _c(color: str, text: str) -> str:
     return f"{_COLORS.get(color, '')}{text}{_COLORS['RESET']}"
 
 
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+def start_queue_logging(target: logging.Logger, handler: logging.Handler):
+    """Send `target`'s records to `handler` from a background thread."""
+    records = queue.SimpleQueue()
+    target.addHandler(_DeferredQueueHandler(records))
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+
+@atexit.register
+def flush_logging():
+    """Write out everything still queued and stop the listener threads."""
+    while _listeners:
+        _listeners.pop().stop()
+
+
 def setup_logging():
-    if not logger.handlers:
-        handler = logging.StreamHandler()
-        handler.setFormatter(logging.Formatter("%(message)s"))
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
-        logger.propagate = False
+    if logger.handlers:
+        return
+    logger.propagate = False
+    if not LOG_CONSOLE:
+        logger.disabled = True
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(_ConsoleFormatter())
+    logger.setLevel(logging.INFO)
+    start_queue_logging(logger, handler)
 
 
-def log_user_message(message: str):
-    logger.info("")
-    logger.info(_c("CYAN", SEPARATOR))
-    logger.info(_c("CYAN", f"  [USER MESSAGE] \"{message}\""))
-    logger.info(_c("CYAN", SEPARATOR))
+def _emit(event: str, **fields):
+    logger.info(event, extra={"fields": fields})
 
 
-def log_tool_call(tool_name: str, tool_input: dict):
-    logger.info("")
-    logger.info(_c("YELLOW", f"  [TOOL CALL] {tool_name}"))
+# ── Rendering (runs on the listener thread) ─────────────────────────────
+
+
+def _render_user_message(message):
+    return [
+        "",
+        _c("CYAN", SEPARATOR),
+        _c("CYAN", f"  [USER MESSAGE] \"{message}\""),
+        _c("CYAN", SEPARATOR),
+    ]
+
+
+def _render_tool_call(tool_name, tool_input):
     try:
         formatted = json.dumps(tool_input, indent=4, ensure_ascii=False)
     except (TypeError, ValueError):
         formatted = str(tool_input)
-    logger.info(_c("YELLOW", f"    Input:  {formatted}"))
+    return [
+        "",
+        _c("YELLOW", f"  [TOOL CALL] {tool_name}"),
+        _c("YELLOW", f"    Input:  {formatted}"),
+    ]
 
 
-def log_tool_result(tool_name: str, result: str, duration_ms: float):
+def _render_tool_result(tool_name, result, duration_ms):
     preview = result[:500] + "..." if len(result) > 500 else result
-    logger.info(_c("YELLOW", f"    Output: {preview}"))
-    logger.info(_c("YELLOW", f"    Duration: {duration_ms:.0f}ms"))
+    return [
+        _c("YELLOW", f"    Output: {preview}"),
+        _c("YELLOW", f"    Duration: {duration_ms:.0f}ms"),
+    ]
 
 
-def log_tool_error(tool_name: str, error: str):
-    logger.info(_c("RED", f"    ERROR: {error}"))
+def _render_tool_error(tool_name, error):
+    return [_c("RED", f"    ERROR: {error}")]
 
 
-def log_llm_response(response: str, duration_ms: float):
-    logger.info("")
+def _render_llm_response(response, duration_ms):
     preview = response[:300] + "..." if len(response) > 300 else response
-    logger.info(_c("GREEN", f"  [LLM RESPONSE] {preview}"))
-    logger.info(_c("GREEN", f"    Duration: {duration_ms:.0f}ms"))
+    return [
+        "",
+        _c("GREEN", f"  [LLM RESPONSE] {preview}"),
+        _c("GREEN", f"    Duration: {duration_ms:.0f}ms"),
+    ]
 
 
-def log_supervisor(verdict: str, reason: str, duration_ms: float):
-    logger.info("")
+def _render_supervisor(verdict, reason, duration_ms):
     color = "GREEN" if verdict == "PASS" else "RED"
-    logger.info(_c("MAGENTA", f"  [SUPERVISOR] Checking response against tool data..."))
-    logger.info(_c(color, f"    Verdict: {verdict}"))
+    lines = [
+        "",
+        _c("MAGENTA", "  [SUPERVISOR] Checking response against tool data..."),
+        _c(color, f"    Verdict: {verdict}"),
+    ]
     if reason:
-        logger.info(_c(color, f"    Reason: {reason}"))
-    logger.info(_c("MAGENTA", f"    Duration: {duration_ms:.0f}ms"))
+        lines.append(_c(color, f"    Reason: {reason}"))
+    lines.append(_c("MAGENTA", f"    Duration: {duration_ms:.0f}ms"))
+    return lines
+
+
+def _render_cache_hit(score):
+    return ["", _c("BLUE", f"  [RESPONSE CACHE] Hit (similarity {score:.2f}), skipping the agent")]
+
+
+def _render_token_usage(usage):
+    parts = ", ".join(
+        f"{name.replace('_', ' ')} {tokens}"
+        for name, tokens in usage["prompt_breakdown"].items() if tokens
+    )
+    approx = "~" if usage["estimated"] else ""
+    return [
+        "",
+        _c("BLUE", f"  [TOKENS] {usage['model_calls']} model call(s)"),
+        _c("BLUE", f"    Prompt: {approx}{usage['prompt_tokens']} ({parts})"),
+        _c("BLUE", f"    Completion: {approx}{usage['completion_tokens']}"),
+        _c("BLUE", f"    Prompt size: {usage['prompt_bytes'] / 1024:.1f} KiB, "
+                   f"{usage['static_prompt_bytes'] / max(usage['prompt_bytes'], 1):.0%} static prefix, "
+                   f"{prefix_cache_hit_rate(usage):.0%} of prompt tokens from the provider cache"),
+    ]
+
+
+def _render_total_duration(duration_ms):
+    return [
+        "",
+        _c("BLUE", f"  Total request time: {duration_ms:.0f}ms"),
+        _c("BLUE", THIN_SEP),
+    ]
+
+
+_RENDERERS = {
+    "user_message": _render_user_message,
+    "tool_call": _render_tool_call,
+    "tool_result": _render_tool_result,
+    "tool_error": _render_tool_error,
+    "llm_response": _render_llm_response,
+    "supervisor": _render_supervisor,
+    "cache_hit": _render_cache_hit,
+    "token_usage": _render_token_usage,
+    "total_duration": _render_total_duration,
+}
+
+
+class _ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        render = _RENDERERS.get(record.msg)
+        if render is None or not hasattr(record, "fields"):
+            return super().format(record)
+        return "\n".join(render(**record.fields))
+
+
+# ── Request-path API ────────────────────────────────────────────────────
+
+
+def log_user_message(message: str):
+    _emit("user_message", message=message)
+
+
+def log_tool_call(tool_name: str, tool_input: dict):
+    _emit("tool_call", tool_name=tool_name, tool_input=tool_input)
+
+
+def log_tool_result(tool_name: str, result: str, duration_ms: float):
+    _emit("tool_result", tool_name=tool_name, result=result, duration_ms=duration_ms)
+
+
+def log_tool_error(tool_name: str, error: str):
+    _emit("tool_error", tool_name=tool_name, error=error)
+
+
+def log_llm_response(response: str, duration_ms: float):
+    _emit("llm_response", response=response, duration_ms=duration_ms)
+
+
+def log_supervisor(verdict: str, reason: str, duration_ms: float):
+    _emit("supervisor", verdict=verdict, reason=reason, duration_ms=duration_ms)
+
+
+def log_cache_hit(score: float):
+    _emit("cache_hit", score=score)
+
+
+def log_token_usage(usage: dict):
+    if usage["model_calls"]:
+        _emit("token_usage", usage=usage)
 
 
 def log_total_duration(duration_ms: float):
-    logger.info("")
-    logger.info(_c("BLUE", f"  Total request time: {duration_ms:.0f}ms"))
-    logger.info(_c("BLUE", THIN_SEP))
+    _emit("total_duration", duration_ms=duration_ms)
 
 
 @contextmanager
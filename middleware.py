@@ -0,0 +1,219 @@
+import asyncio
+import threading
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import ToolMessage
+
+from config import (
+    TOOL_CONCURRENCY_LIMITS,
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_KEEP_TURNS,
+    LLM_COMPLETION_ALLOWANCE,
+)
+from history import compact_messages
+from scheduler import PRIORITY_AGENT, scheduler as default_scheduler
+from telemetry import span
+from usage import prompt_breakdown, prompt_bytes, tool_schema
+
+
+class ToolConcurrencyMiddleware(AgentMiddleware):
+    """Cap how many calls of the same tool one run has in flight at once.
+
+    Tool calls from a single model step are executed concurrently by the agent
+    graph (bounded overall by the `max_concurrency` run config). This adds a
+    per-tool ceiling so one fan-out can't open too many connections to a
+    single upstream API. Tools without a configured limit are not throttled.
+
+    The compiled agent is shared by every session, so the semaphores are kept
+    per run (by thread_id) and dropped once no call holds or waits for them.
+    The process-wide cap on upstream connections is the per-host limit in
+    tools/http.py. Time spent waiting for a slot is traced as
+    "tool.<name>.wait".
+    """
+
+    def __init__(self, limits: dict[str, int] | None = None):
+        super().__init__()
+        self.limits = dict(TOOL_CONCURRENCY_LIMITS if limits is None else limits)
+        # key -> [semaphore, calls holding or waiting for it]
+        self._semaphores: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _run_key(request) -> str | None:
+        config = getattr(request.runtime, "config", None) or {}
+        return config.get("configurable", {}).get("thread_id")
+
+    def _new_semaphore(self, name: str):
+        return threading.BoundedSemaphore(self.limits[name])
+
+    def _new_async_semaphore(self, name: str):
+        return asyncio.Semaphore(self.limits[name])
+
+    def _checkout(self, key: tuple, new):
+        with self._lock:
+            entry = self._semaphores.get(key)
+            if entry is None:
+                entry = self._semaphores[key] = [new(key[-1]), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _checkin(self, key: tuple):
+        with self._lock:
+            entry = self._semaphores[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._semaphores[key]
+
+    def wrap_tool_call(self, request, handler):
+        name = request.tool_call["name"]
+        if name not in self.limits:
+            return handler(request)
+        key = (self._run_key(request), name)
+        semaphore = self._checkout(key, self._new_semaphore)
+        try:
+            with span(f"tool.{name}.wait"):
+                semaphore.acquire()
+            try:
+                return handler(request)
+            finally:
+                semaphore.release()
+        finally:
+            self._checkin(key)
+
+    async def awrap_tool_call(self, request, handler):
+        name = request.tool_call["name"]
+        if name not in self.limits:
+            return await handler(request)
+        # asyncio semaphores are bound to the loop they're first used on.
+        key = (asyncio.get_running_loop(), self._run_key(request), name)
+        semaphore = self._checkout(key, self._new_async_semaphore)
+        try:
+            with span(f"tool.{name}.wait"):
+                await semaphore.acquire()
+            try:
+                return await handler(request)
+            finally:
+                semaphore.release()
+        finally:
+            self._checkin(key)
+
+
+class HistoryCompactionMiddleware(AgentMiddleware):
+    """Compact the thread's history before a model call once it exceeds a token budget.
+
+    See history.py for what is digested or dropped. The rewrite is stored in
+    the checkpoint, so later turns start from the compacted history.
+    """
+
+    def __init__(self, budget: int = HISTORY_TOKEN_BUDGET, keep_turns: int = HISTORY_KEEP_TURNS):
+        super().__init__()
+        self.budget = budget
+        self.keep_turns = keep_turns
+
+    def before_model(self, state, runtime):
+        return compact_messages(state["messages"], self.budget, self.keep_turns)
+
+    async def abefore_model(self, state, runtime):
+        return compact_messages(state["messages"], self.budget, self.keep_turns)
+
+
+class ToolSchemaCacheMiddleware(AgentMiddleware):
+    """Bind the model to tool schemas converted once per tool, not on every call.
+
+    bind_tools() otherwise rebuilds every schema from the tool's signature and
+    docstring on each model call. The cached dicts also keep the schemas
+    byte-identical from call to call, which provider prompt caching relies on.
+    Tools still run from the agent's own tool list.
+    """
+
+    def wrap_model_call(self, request, handler):
+        return handler(request.override(tools=[tool_schema(t) for t in request.tools]))
+
+    async def awrap_model_call(self, request, handler):
+        return await handler(request.override(tools=[tool_schema(t) for t in request.tools]))
+
+
+class PromptAccountingMiddleware(AgentMiddleware):
+    """Record on each AI message how its prompt was made up (see usage.py).
+
+    Place it after any middleware that changes the system prompt or messages,
+    so it sees the request as it is actually sent. `static_prefix` is the start
+    of the system prompt that is the same for every user and turn.
+    """
+
+    def __init__(self, static_prefix: str = ""):
+        super().__init__()
+        self.static_prefix = static_prefix
+
+    def _annotate(self, request, response):
+        breakdown = prompt_breakdown(request.system_prompt, request.messages, request.tools)
+        sizes = prompt_bytes(request.system_prompt, request.messages, request.tools, self.static_prefix)
+        for msg in response.result:
+            if msg.type == "ai":
+                msg.response_metadata["prompt_breakdown"] = breakdown
+                msg.response_metadata["prompt_bytes"] = sizes
+        return response
+
+    def wrap_model_call(self, request, handler):
+        return self._annotate(request, handler(request))
+
+    async def awrap_model_call(self, request, handler):
+        return self._annotate(request, await handler(request))
+
+
+class RateLimitMiddleware(AgentMiddleware):
+    """Send model calls through the shared LLMScheduler (see scheduler.py).
+
+    Calls wait for room under the RPM/TPM limits instead of failing, and
+    rate-limit or transient errors are retried with backoff.
+    """
+
+    def __init__(self, scheduler=None, priority: int = PRIORITY_AGENT):
+        super().__init__()
+        self.scheduler = scheduler or default_scheduler
+        self.priority = priority
+
+    @staticmethod
+    def _estimate(request) -> int:
+        breakdown = prompt_breakdown(request.system_prompt, request.messages, request.tools)
+        return sum(breakdown.values()) + LLM_COMPLETION_ALLOWANCE
+
+    def wrap_model_call(self, request, handler):
+        return self.scheduler.call(lambda: handler(request), self.priority, self._estimate(request))
+
+    async def awrap_model_call(self, request, handler):
+        return await self.scheduler.acall(lambda: handler(request), self.priority, self._estimate(request))
+
+
+class TelemetryMiddleware(AgentMiddleware):
+    """Trace every model call ("llm") and tool call ("tool.<name>") as a span.
+
+    Each ToolMessage also gets the tool's run time in
+    response_metadata["duration_ms"]. Place it last, so time spent waiting on
+    ToolConcurrencyMiddleware is not counted as tool latency; that middleware
+    traces the wait as "tool.<name>.wait" instead.
+    """
+
+    @staticmethod
+    def _stamp(result, elapsed_ms: float):
+        if isinstance(result, ToolMessage):
+            result.response_metadata["duration_ms"] = round(elapsed_ms, 1)
+        return result
+
+    def wrap_model_call(self, request, handler):
+        with span("llm"):
+            return handler(request)
+
+    async def awrap_model_call(self, request, handler):
+        with span("llm"):
+            return await handler(request)
+
+    def wrap_tool_call(self, request, handler):
+        with span(f"tool.{request.tool_call['name']}") as s:
+            result = handler(request)
+        return self._stamp(result, s["elapsed_ms"])
+
+    async def awrap_tool_call(self, request, handler):
+        with span(f"tool.{request.tool_call['name']}") as s:
+            result = await handler(request)
+        return self._stamp(result, s["elapsed_ms"])
@@ -0,0 +1,105 @@
+"""Checkpointer (chat history) and store (user preferences) backends.
+
+The backend is picked by CHECKPOINT_BACKEND / STORE_BACKEND in config.py:
+
+- "memory": in-process only; fastest, but lost on restart and not shared.
+- "sqlite": one database file shared by every process on the host, in WAL
+  mode so readers never block the writer. Each process keeps a single
+  connection guarded by the saver's lock, and waits on busy_timeout rather
+  than failing when another process holds the write lock.
+- "postgres": for processes on several hosts, through a psycopg connection
+  pool. Needs `pip install langgraph-checkpoint-postgres "psycopg[pool]"`.
+"""
+import os
+import sqlite3
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.store.memory import InMemoryStore
+
+from config import (
+    CHECKPOINT_BACKEND,
+    STORE_BACKEND,
+    SQLITE_DB_PATH,
+    SQLITE_BUSY_TIMEOUT_MS,
+    POSTGRES_URL,
+    POSTGRES_POOL_SIZE,
+)
+
+_pg_pool = None
+
+
+def _sqlite_connect(path: str, manual_transactions: bool = False) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Savers serialize access with their own lock, so sharing across threads is safe.
+    # SqliteStore issues its own BEGIN/COMMIT and needs the driver not to.
+    conn = sqlite3.connect(
+        path,
+        check_same_thread=False,
+        isolation_level=None if manual_transactions else "",
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def _postgres_pool():
+    global _pg_pool
+    if _pg_pool is None:
+        if not POSTGRES_URL:
+            raise ValueError("POSTGRES_URL must be set to use the postgres backend.")
+        from psycopg.rows import dict_row
+        from psycopg_pool import ConnectionPool
+
+        _pg_pool = ConnectionPool(
+            POSTGRES_URL,
+            max_size=POSTGRES_POOL_SIZE,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        )
+    return _pg_pool
+
+
+def create_checkpointer(backend: str = CHECKPOINT_BACKEND):
+    """Build the chat-history checkpointer for `backend`."""
+    if backend == "memory":
+        return InMemorySaver()
+
+    if backend == "sqlite":
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        saver = SqliteSaver(_sqlite_connect(SQLITE_DB_PATH))
+        saver.setup()
+        return saver
+
+    if backend == "postgres":
+        from langgraph.checkpoint.postgres import PostgresSaver
+
+        saver = PostgresSaver(_postgres_pool())
+        saver.setup()
+        return saver
+
+    raise ValueError(f"Unknown checkpoint backend: {backend!r}")
+
+
+def create_store(backend: str = STORE_BACKEND):
+    """Build the long-term memory store for `backend`."""
+    if backend == "memory":
+        return InMemoryStore()
+
+    if backend == "sqlite":
+        from langgraph.store.sqlite import SqliteStore
+
+        store = SqliteStore(_sqlite_connect(SQLITE_DB_PATH, manual_transactions=True))
+        store.setup()
+        return store
+
+    if backend == "postgres":
+        from langgraph.store.postgres import PostgresStore
+
+        store = PostgresStore(_postgres_pool())
+        store.setup()
+        return store
+
+    raise ValueError(f"Unknown store backend: {backend!r}")
@@ -0,0 +1,68 @@
+"""Per-user profile data (home location, saved preferences) in the long-term store.
+
+Every user gets their own namespace, ("users", <user_id>), so concurrent
+sessions never share or overwrite a record. Reads go through a bounded
+in-process cache; writes update the store first and then the cache. With a
+shared backend (sqlite/postgres) another process's writes become visible
+here once the cached entry expires: after PROFILE_NEGATIVE_CACHE_TTL for a
+key that wasn't set yet, PROFILE_CACHE_TTL otherwise. Merges read the store
+itself, so they never write back a stale copy.
+"""
+from config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL, PROFILE_NEGATIVE_CACHE_TTL
+from tools.cache import MISSING, LRUCache
+
+PREFERENCES_KEY = "preferences"
+HOME_LOCATION_KEY = "home_location"
+
+
+def user_namespace(user_id: str) -> tuple[str, str]:
+    return ("users", user_id)
+
+
+class ProfileStore:
+    """Read-through cache in front of a langgraph BaseStore, keyed by user."""
+
+    def __init__(
+        self,
+        store,
+        maxsize: int = PROFILE_CACHE_SIZE,
+        ttl: float = PROFILE_CACHE_TTL,
+        negative_ttl: float = PROFILE_NEGATIVE_CACHE_TTL,
+    ):
+        self.store = store
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache = LRUCache(maxsize)
+
+    def _load(self, user_id: str, key: str):
+        """Read the store, bypassing the cache, and cache what was read."""
+        item = self.store.get(user_namespace(user_id), key)
+        value = item.value if item else None
+        self._cache.set((user_id, key), value, self.ttl if value is not None else self.negative_ttl)
+        return value
+
+    def get(self, user_id: str, key: str):
+        cached = self._cache.get((user_id, key))
+        if cached is not MISSING:
+            return cached
+        return self._load(user_id, key)
+
+    def put(self, user_id: str, key: str, value: dict):
+        self.store.put(user_namespace(user_id), key, value)
+        self._cache.set((user_id, key), value, self.ttl)
+
+    def get_preferences(self, user_id: str) -> dict:
+        return self.get(user_id, PREFERENCES_KEY) or {}
+
+    def save_preferences(self, user_id: str, preferences: dict) -> dict:
+        """Merge `preferences` into the user's saved ones. Returns the merged result."""
+        # Not from the cache: another process may have saved keys since it was filled.
+        merged = {**(self._load(user_id, PREFERENCES_KEY) or {}), **preferences}
+        self.put(user_id, PREFERENCES_KEY, merged)
+        return merged
+
+    def get_home_location(self, user_id: str) -> dict | None:
+        return self.get(user_id, HOME_LOCATION_KEY)
+
+    def set_home_location(self, user_id: str, location: dict):
+        self.put(user_id, HOME_LOCATION_KEY, location)
@@ -0,0 +1,169 @@
+"""Opt-in cache of whole agent turns for repeated opening questions.
+
+Many conversations open with nearly the same request ("beach destinations in
+July"). Entries are partitioned by the user's home location and preferences,
+and a new question matches a cached one when their character n-gram TF-IDF
+vectors are close enough. Questions whose months or numbers differ never
+match, and neither do ones whose content words mostly differ ("Rome" vs
+"Nome").
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from config import (
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_THRESHOLD,
+)
+
+_NGRAM_SIZES = (3, 4, 5)
+_WORD = re.compile(r"[a-z0-9]+")
+_MONTHS = {
+    "january", "february", "march", "april", "may", "june", "july", "august",
+    "september", "october", "november", "december",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+_STOPWORDS = {
+    "a", "an", "the", "in", "on", "at", "to", "for", "from", "of", "and", "or", "with",
+    "i", "me", "my", "we", "our", "you", "is", "are", "be", "it", "what", "where",
+    "which", "some", "any", "can", "could", "would", "should", "want", "like", "go",
+    "going", "trip", "please", "recommend", "suggest", "give", "show", "find", "good",
+    "best", "nice", "great", "there", "places", "place",
+}
+_MIN_WORD_OVERLAP = 0.75
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def _significant_words(text: str) -> list[str]:
+    """Words of a normalized query without filler, with plural "s" stripped."""
+    return [
+        w[:-1] if len(w) > 3 and w.endswith("s") and w not in _MONTHS else w
+        for w in text.split() if w not in _STOPWORDS
+    ]
+
+
+def _ngrams(words: list[str]) -> Counter:
+    padded = " {} ".format(" ".join(words))
+    return Counter(
+        padded[i:i + n] for n in _NGRAM_SIZES for i in range(len(padded) - n + 1)
+    )
+
+
+def _key_terms(words: list[str]) -> tuple[frozenset, frozenset]:
+    """(months and numbers, remaining content words)."""
+    exact = frozenset(w for w in words if w in _MONTHS or w.isdigit())
+    return exact, frozenset(words) - exact
+
+
+class ResponseCache:
+    """Similarity-matched, TTL-bounded LRU of invoke_agent() results."""
+
+    def __init__(
+        self,
+        maxsize: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        threshold: float = RESPONSE_CACHE_THRESHOLD,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: OrderedDict[int, dict] = OrderedDict()
+        self._partitions: dict[str, set[int]] = {}
+        self._df: Counter = Counter()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _idf(self, gram: str) -> float:
+        return math.log((1 + len(self._entries)) / (1 + self._df[gram])) + 1
+
+    def _similarity(self, a: Counter, b: Counter) -> float:
+        dot = sum(count * b[g] * self._idf(g) ** 2 for g, count in a.items() if g in b)
+        if not dot:
+            return 0.0
+        norm_a = math.sqrt(sum((c * self._idf(g)) ** 2 for g, c in a.items()))
+        norm_b = math.sqrt(sum((c * self._idf(g)) ** 2 for g, c in b.items()))
+        return dot / (norm_a * norm_b)
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for gram in entry["grams"]:
+            self._df[gram] -= 1
+            if self._df[gram] <= 0:
+                del self._df[gram]
+        ids = self._partitions.get(entry["partition"])
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._partitions[entry["partition"]]
+
+    def lookup(self, query: str, partition: str) -> tuple[dict, float] | None:
+        """Best cached result for a similar query in the same partition, with its score."""
+        text = normalize_query(query)
+        words = _significant_words(text)
+        grams = _ngrams(words)
+        exact, content = _key_terms(words)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_score = None, 0.0
+            for entry_id in list(self._partitions.get(partition, ())):
+                entry = self._entries[entry_id]
+                if entry["expires_at"] < now:
+                    self._remove(entry_id)
+                    continue
+                if entry["exact"] != exact:
+                    continue
+                union = content | entry["content"]
+                if union and len(content & entry["content"]) / len(union) < _MIN_WORD_OVERLAP:
+                    continue
+                score = 1.0 if entry["text"] == text else self._similarity(grams, entry["grams"])
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self._stats["hits"] += 1
+            return self._entries[best_id]["result"], best_score
+
+    def store(self, query: str, partition: str, result: dict):
+        text = normalize_query(query)
+        words = _significant_words(text)
+        grams = _ngrams(words)
+        exact, content = _key_terms(words)
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "text": text,
+                "grams": grams,
+                "exact": exact,
+                "content": content,
+                "partition": partition,
+                "result": result,
+                "expires_at": time.time() + self.ttl,
+            }
+            self._partitions.setdefault(partition, set()).add(entry_id)
+            self._df.update(grams.keys())
+            self._stats["stores"] += 1
+
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,261 @@
+"""Client-side rate limiting and retries for Groq calls.
+
+The agent model (through RateLimitMiddleware) and the supervisor share one
+LLMScheduler. Every call:
+
+1. Waits in a priority queue until the request-per-minute and
+   token-per-minute buckets both have room. Agent calls (user-facing) are
+   served before supervisor checks.
+2. Runs. Afterwards, the token estimate is corrected with the usage the
+   provider reports.
+3. On a rate-limit response, pauses the whole queue for the server's
+   retry-after (or a jittered exponential backoff) and re-queues the call.
+   Transient server and connection errors are retried with backoff too.
+
+Under load, calls wait longer instead of failing. Queue depth and retry
+counters are available from stats().
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from config import GROQ_RPM, GROQ_TPM, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX
+from telemetry import span
+
+PRIORITY_AGENT = 0
+PRIORITY_SUPERVISOR = 1
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout"}
+
+
+class TokenBucket:
+    """`rate_per_minute` units, refilled continuously. The level may go negative (debt)."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.level = self.capacity
+        self._refill_per_sec = rate_per_minute / 60
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self._refill_per_sec)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self._refill_per_sec
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _Ticket:
+    __slots__ = ("tokens", "cancelled", "_event", "_loop", "_future")
+
+    def __init__(self, tokens: int, loop=None, future=None):
+        self.tokens = tokens
+        self.cancelled = False
+        self._event = threading.Event() if future is None else None
+        self._loop = loop
+        self._future = future
+
+    def grant(self):
+        if self._future is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(_resolve, self._future)
+
+    def wait(self):
+        self._event.wait()
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _status_code(error: Exception) -> int | None:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(error: Exception) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _total_tokens(result) -> int | None:
+    """Tokens used by a model result (AIMessage or middleware ModelResponse), if reported."""
+    messages = getattr(result, "result", None) or [result]
+    used = [getattr(m, "usage_metadata", None) for m in messages]
+    used = [u["total_tokens"] for u in used if u and "total_tokens" in u]
+    return sum(used) if used else None
+
+
+class LLMScheduler:
+    """Shared, priority-ordered admission for LLM calls under RPM/TPM limits."""
+
+    def __init__(
+        self,
+        rpm: int = GROQ_RPM,
+        tpm: int = GROQ_TPM,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._paused_until = 0.0
+        self._queue: list[tuple[int, int, _Ticket]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._dispatcher: threading.Thread | None = None
+        self._stats = {"granted": 0, "retries": 0, "rate_limited": 0, "failed": 0, "max_queued": 0}
+
+    # ── Queue ──────────────────────────────────────────────────────────
+
+    def _enqueue(self, priority: int, ticket: _Ticket):
+        with self._cond:
+            heapq.heappush(self._queue, (priority, next(self._seq), ticket))
+            self._stats["max_queued"] = max(self._stats["max_queued"], len(self._queue))
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="llm-scheduler", daemon=True)
+                self._dispatcher.start()
+            self._cond.notify()
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, ticket = self._queue[0]
+                if ticket.cancelled:
+                    heapq.heappop(self._queue)
+                    continue
+                now = time.monotonic()
+                wait = max(
+                    self._paused_until - now,
+                    self._requests.wait_time(1, now),
+                    self._tokens.wait_time(ticket.tokens, now),
+                )
+                if wait > 0:
+                    # Wakes early if a higher-priority call arrives or the pause changes.
+                    self._cond.wait(timeout=wait)
+                    continue
+                heapq.heappop(self._queue)
+                self._requests.take(1)
+                self._tokens.take(ticket.tokens)
+                self._stats["granted"] += 1
+            ticket.grant()
+
+    def acquire(self, priority: int = PRIORITY_AGENT, tokens: int = 0):
+        """Block until a call estimated at `tokens` may be sent."""
+        ticket = _Ticket(tokens)
+        self._enqueue(priority, ticket)
+        ticket.wait()
+
+    async def aacquire(self, priority: int = PRIORITY_AGENT, tokens: int = 0):
+        """Async variant of acquire(); does not block the event loop."""
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(tokens, loop=loop, future=loop.create_future())
+        self._enqueue(priority, ticket)
+        try:
+            await ticket._future
+        except asyncio.CancelledError:
+            ticket.cancelled = True
+            raise
+
+    def settle(self, estimated: int, used: int | None):
+        """Correct the token bucket once the real usage of a call is known."""
+        if used is None:
+            return
+        with self._cond:
+            if used > estimated:
+                self._tokens.take(used - estimated)
+            else:
+                self._tokens.give_back(estimated - used)
+
+    # ── Retries ────────────────────────────────────────────────────────
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float | None:
+        """Seconds to wait before retrying `error`, or None if it should propagate."""
+        status = _status_code(error)
+        retryable = status in _RETRYABLE_STATUS or type(error).__name__ in _RETRYABLE_ERRORS
+        with self._cond:
+            if not retryable or attempt >= self.max_retries:
+                self._stats["failed"] += 1
+                return None
+            self._stats["retries"] += 1
+            delay = self._backoff(attempt)
+            if status != 429:
+                return delay
+            self._stats["rate_limited"] += 1
+            # Every caller is over the limit, not just this one: hold the whole queue.
+            delay = max(delay, _retry_after(error) or 0)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._cond.notify()
+            return 0.0
+
+    def call(self, fn, priority: int = PRIORITY_AGENT, tokens: int = 0):
+        """Run `fn()` under the rate limits, retrying rate-limit and transient errors."""
+        for attempt in itertools.count():
+            with span("llm.queue"):
+                self.acquire(priority, tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.settle(tokens, _total_tokens(result))
+            return result
+
+    async def acall(self, fn, priority: int = PRIORITY_AGENT, tokens: int = 0):
+        """Async variant of call(); `fn()` returns an awaitable."""
+        for attempt in itertools.count():
+            with span("llm.queue"):
+                await self.aacquire(priority, tokens)
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.settle(tokens, _total_tokens(result))
+            return result
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queued"] = sum(1 for _, _, t in self._queue if not t.cancelled)
+            stats["paused_for_s"] = round(max(0.0, self._paused_until - time.monotonic()), 2)
+        return stats
+
+
+scheduler = LLMScheduler()
@@ -0,0 +1,212 @@
+"""Headless HTTP API for the trip agent, next to the Streamlit UI in app.py.
+
+    python server.py --workers 4
+    uvicorn server:app --workers 4
+
+Endpoints (JSON in and out):
+
+- POST /v1/chat                  {user_id, message, thread_id?}: one turn via invoke_agent()
+- POST /v1/chat/stream           same body; the stream_agent() events as Server-Sent Events
+- GET  /v1/cities/validate       ?city=&country=: geocoded location, 404 if unknown
+- PUT  /v1/users/{user_id}/home  {city, country}: onboarding, validates and saves the home location
+- GET  /v1/users/{user_id}       home location and saved preferences
+- GET  /v1/stats                 per-stage latency, scheduler, HTTP, cache and coalescing counters
+- GET  /healthz
+
+A turn without a thread_id starts a new conversation; its id is returned as
+thread_id (and the X-Thread-Id header for streams) to continue it.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import agent
+from config import CHECKPOINT_BACKEND, SERVER_HOST, SERVER_PORT, SERVER_WORKERS, STORE_BACKEND
+from logger import setup_logging
+from scheduler import scheduler
+from telemetry import stage_stats
+from tools import http
+from tools.places import places_cache_stats
+from tools.results import to_dict
+from tools.singleflight import singleflight_stats
+from tools.weather import avalidate_city, climate_cache_stats, geocode_cache_stats
+
+
+class BadRequest(Exception):
+    """The request body or query is missing a field or is not valid JSON."""
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status)
+
+
+async def _body(request: Request, *required: str) -> dict:
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise BadRequest("Request body must be JSON.")
+    if not isinstance(body, dict):
+        raise BadRequest("Request body must be a JSON object.")
+    missing = [name for name in required if not isinstance(body.get(name), str) or not body[name].strip()]
+    if missing:
+        raise BadRequest(f"Missing field(s): {', '.join(missing)}.")
+    return body
+
+
+def _turn_args(body: dict) -> tuple[str, str, str]:
+    """(message, thread_id, user_id) for a chat turn; a new thread_id when none is given."""
+    return body["message"], body.get("thread_id") or uuid.uuid4().hex, body["user_id"]
+
+
+def _serialize_result(result: dict, thread_id: str) -> dict:
+    """A turn result as JSON: structured tool results become dicts, futures are dropped."""
+    return {
+        **{k: v for k, v in result.items() if k not in ("tool_calls", "supervisor_future")},
+        "tool_calls": [{**tc, "data": to_dict(tc.get("data"))} for tc in result.get("tool_calls", [])],
+        "thread_id": thread_id,
+    }
+
+
+def _sse(event: dict, thread_id: str) -> str:
+    if event["type"] == "done":
+        event = {**event, "result": _serialize_result(event["result"], thread_id)}
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+def _home_location_error(location: dict | None, city: str, country: str) -> str | None:
+    """Same rules as the onboarding form in app.py."""
+    if not location:
+        return f"Could not find '{city}, {country}'. Please check the spelling and try again."
+    if location["country"].lower() != country.strip().lower():
+        return f"'{city}' was found in {location['country']}, not in {country}. Please check the city and country."
+    return None
+
+
+async def chat(request: Request):
+    body = await _body(request, "user_id", "message")
+    message, thread_id, user_id = _turn_args(body)
+    # invoke_agent() runs in the thread pool rather than ainvoke_agent() on the
+    # loop: the sqlite and postgres backends that several workers need are sync-only.
+    result = await run_in_threadpool(
+        agent.invoke_agent, agent.get_trip_agent(), message, thread_id=thread_id, user_id=user_id
+    )
+    return JSONResponse(_serialize_result(result, thread_id))
+
+
+async def chat_stream(request: Request):
+    body = await _body(request, "user_id", "message")
+    message, thread_id, user_id = _turn_args(body)
+    # stream_agent() is a blocking generator; Starlette steps it in its thread pool.
+    events = agent.stream_agent(agent.get_trip_agent(), message, thread_id=thread_id, user_id=user_id)
+    return StreamingResponse(
+        (_sse(event, thread_id) for event in events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Thread-Id": thread_id},
+    )
+
+
+async def validate_city(request: Request):
+    city = request.query_params.get("city", "").strip()
+    if not city:
+        raise BadRequest("Missing query parameter: city.")
+    location = await avalidate_city(city, request.query_params.get("country") or None)
+    if location is None:
+        return _error(404, f"City '{city}' not found.")
+    return JSONResponse(location)
+
+
+async def set_home(request: Request):
+    body = await _body(request, "city", "country")
+    city, country = body["city"].strip(), body["country"].strip()
+    location = await avalidate_city(city, country)
+    if message := _home_location_error(location, city, country):
+        return _error(422, message)
+    await run_in_threadpool(agent.profiles.set_home_location, request.path_params["user_id"], location)
+    return JSONResponse(location)
+
+
+async def get_user(request: Request):
+    user_id = request.path_params["user_id"]
+    home, preferences = await asyncio.gather(
+        run_in_threadpool(agent.profiles.get_home_location, user_id),
+        run_in_threadpool(agent.profiles.get_preferences, user_id),
+    )
+    return JSONResponse({"user_id": user_id, "home_location": home, "preferences": preferences})
+
+
+async def stats(request: Request):
+    return JSONResponse({
+        "stages": stage_stats(),
+        "scheduler": scheduler.stats(),
+        "http": http.http_stats(),
+        "caches": {
+            "geocode": geocode_cache_stats(),
+            "climate": climate_cache_stats(),
+            "places": places_cache_stats(),
+        },
+        "coalesced": singleflight_stats(),
+    })
+
+
+async def healthz(request: Request):
+    return JSONResponse({"status": "ok"})
+
+
+async def _bad_request(request: Request, exc: BadRequest):
+    return _error(400, str(exc))
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    # Runs in every worker process.
+    setup_logging()
+    # Compile the graph before the first request instead of during it.
+    await run_in_threadpool(agent.get_trip_agent)
+    yield
+    await run_in_threadpool(http.close)
+
+
+app = Starlette(
+    routes=[
+        Route("/v1/chat", chat, methods=["POST"]),
+        Route("/v1/chat/stream", chat_stream, methods=["POST"]),
+        Route("/v1/cities/validate", validate_city, methods=["GET"]),
+        Route("/v1/users/{user_id}/home", set_home, methods=["PUT"]),
+        Route("/v1/users/{user_id}", get_user, methods=["GET"]),
+        Route("/v1/stats", stats, methods=["GET"]),
+        Route("/healthz", healthz, methods=["GET"]),
+    ],
+    exception_handlers={BadRequest: _bad_request},
+    lifespan=lifespan,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the trip agent HTTP API.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    args = parser.parse_args()
+
+    if args.workers > 1 and "memory" in (CHECKPOINT_BACKEND, STORE_BACKEND):
+        sys.exit(
+            "Several workers need shared chat history and profiles: "
+            "set CHECKPOINT_BACKEND and STORE_BACKEND to sqlite or postgres."
+        )
+
+    import uvicorn
+
+    uvicorn.run("server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,16 @@
+import contextvars
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
 from langchain.chat_models import init_chat_model
 
+from config import GROUNDING_TOLERANCE, SUPERVISOR_ENGINE, LLM_COMPLETION_ALLOWANCE
 from logger import log_supervisor, timer
+from scheduler import PRIORITY_SUPERVISOR, scheduler
+from telemetry import traced
+from tools.results import DestinationsResult, WeatherComparison, WeatherResult, render_compact
+from usage import token_usage
 
 SUPERVISOR_MODEL = "llama-3.1-8b-instant"
 
@@ -24,37 +34,71 @@ REASON: one sentence
 
 
 _supervisor_model = None
+_supervisor_model_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="supervisor")
+
+_NUM = r"-?\d+(?:\.\d+)?"
+
+# Values as get_weather prints them: "21.3°C", "45.0 mm", "0.0 cm".
+_TOOL_VALUE = re.compile(rf"({_NUM})\s*(°C|mm|cm)")
+_TOOL_UNIT_KIND = {"°C": "temperature", "mm": "precipitation", "cm": "snowfall"}
+_RESULT_FIELDS = {
+    "temperature": ("avg_temp", "max_temp", "min_temp"),
+    "precipitation": ("total_precip",),
+    "snowfall": ("total_snow",),
+}
+
+# Weather-like numeric claims in free text, optionally as a range:
+# "21°C", "18-25 °C", "70°F", "31.2 C", "21 degrees", "45mm", "3 cm of snow".
+_CLAIM = re.compile(
+    rf"(?<![\w.])({_NUM})(?:\s*(?:°\s*[CF]?)?\s*(?:-|–|to)\s*({_NUM}))?\s*"
+    r"(°\s*F\b|degrees?\s+(?:F\b|fahrenheit)|(?-i:F)\b"
+    r"|°\s*C?|degrees?(?:\s+(?:C\b|celsius))?|(?-i:C)\b"
+    r"|mm\b|millimet(?:er|re)s?\b|cm\b|centimet(?:er|re)s?\b)",
+    re.IGNORECASE,
+)
+# Without a degree sign or "degrees C/F", a number only counts when its
+# sentence is about the weather: "3 cm of fresh snow" and "highs of 31 C" are
+# claims, "a 2 degree slope", "a 35 mm lens" or "bus 15 C" aren't.
+_CLAIM_CONTEXT = {
+    "temperature": re.compile(
+        r"\b(?:temp\w*|warm\w*|hot|cold\w*|cool\w*|mild|chilly|freez\w*|heat|highs?|lows?|weather|climate)\b",
+        re.IGNORECASE,
+    ),
+    "precipitation": re.compile(r"\b(?:rain\w*|precip\w*|wet\w*|showers?|drizzl\w*|downpours?)\b", re.IGNORECASE),
+    "snowfall": re.compile(r"\b(?:snow\w*|powder)\b", re.IGNORECASE),
+}
+_SENTENCE_END = re.compile(r"[.!?](?=\s|$)|\n")
 
 
 def _get_model():
     global _supervisor_model
     if _supervisor_model is None:
-        _supervisor_model = init_chat_model(
-            SUPERVISOR_MODEL, model_provider="groq", temperature=0
-        )
+        with _supervisor_model_lock:
+            if _supervisor_model is None:
+                _supervisor_model = init_chat_model(
+                    # Retries are left to the scheduler.
+                    SUPERVISOR_MODEL, model_provider="groq", temperature=0, max_retries=0
+                )
     return _supervisor_model
 
 
-def run_supervisor(
+def _evidence_line(tool_output: dict) -> str:
+    data = tool_output.get("data")
+    if data is not None:
+        return f"- {tool_output['name']}: {render_compact(data)}"
+    return f"- {tool_output['name']} {tool_output['input']}:\n{tool_output['output']}"
+
+
+def _build_check_prompt(
     user_message: str,
     tool_outputs: list[dict],
     agent_response: str,
-    user_context: str = "",
-) -> dict:
-    """Validate the agent's response against tool evidence.
-
-    Returns dict with keys: passed (bool), verdict (str), reason (str)
-    """
-    if not tool_outputs:
-        log_supervisor("PASS", "No tools were used — conversational response", 0)
-        return {"passed": True, "verdict": "PASS", "reason": "No tools used"}
+    user_context: str,
+) -> str:
+    tool_evidence = "\n".join(_evidence_line(t) for t in tool_outputs)
 
-    tool_evidence = "\n\n".join(
-        f"Tool: {t['name']}\nInput: {t['input']}\nOutput: {t['output']}"
-        for t in tool_outputs
-    )
-
-    check_prompt = (
+    return (
         f"USER QUESTION:\n{user_message}\n\n"
         f"USER CONTEXT (known, not fabricated):\n{user_context}\n\n"
         f"TOOL EVIDENCE:\n{tool_evidence}\n\n"
@@ -62,22 +106,23 @@ def run_supervisor(
         f"Are the tool-sourced claims in the response grounded in the tool evidence?"
     )
 
-    try:
-        with timer() as t:
-            model = _get_model()
-            result = model.invoke([
-                {"role": "system", "content": SUPERVISOR_PROMPT},
-                {"role": "user", "content": check_prompt},
-            ])
-    except Exception as e:
-        log_supervisor("SKIP", f"Supervisor error: {str(e)[:100]}", 0)
-        return {"passed": True, "verdict": "SKIP", "reason": "Supervisor unavailable"}
 
-    response_text = result.content.strip()
+def _check_messages(check_prompt: str) -> list[dict]:
+    return [
+        {"role": "system", "content": SUPERVISOR_PROMPT},
+        {"role": "user", "content": check_prompt},
+    ]
+
+
+def _estimate_tokens(check_prompt: str) -> int:
+    return (len(SUPERVISOR_PROMPT) + len(check_prompt)) // 4 + LLM_COMPLETION_ALLOWANCE
+
+
+def _parse_verdict(response_text: str, duration_ms: float) -> dict:
     verdict = "PASS"
     reason = ""
 
-    for line in response_text.split("\n"):
+    for line in response_text.strip().split("\n"):
         line = line.strip()
         if line.upper().startswith("VERDICT:"):
             verdict = line.split(":", 1)[1].strip().upper()
@@ -85,6 +130,229 @@ def run_supervisor(
             reason = line.split(":", 1)[1].strip()
 
     passed = verdict == "PASS"
-    log_supervisor(verdict, reason, t["elapsed_ms"])
+    log_supervisor(verdict, reason, duration_ms)
 
     return {"passed": passed, "verdict": verdict, "reason": reason}
+
+
+def _no_tools_result() -> dict:
+    log_supervisor("PASS", "No tools were used — conversational response", 0)
+    return {"passed": True, "verdict": "PASS", "reason": "No tools used"}
+
+
+def _unavailable_result(e: Exception) -> dict:
+    log_supervisor("SKIP", f"Supervisor error: {str(e)[:100]}", 0)
+    return {"passed": True, "verdict": "SKIP", "reason": "Supervisor unavailable"}
+
+
+def _claim_kind(unit: str) -> tuple[str, bool]:
+    """Map a unit spelling to (evidence kind, is_fahrenheit)."""
+    unit = unit.lower()
+    if unit.startswith("mm") or unit.startswith("milli"):
+        return "precipitation", False
+    if unit.startswith("cm") or unit.startswith("centi"):
+        return "snowfall", False
+    return "temperature", unit.endswith("f") or "fahrenheit" in unit
+
+
+def _is_explicit(unit: str) -> bool:
+    """True for a unit that can only be a temperature: a degree sign or "degrees" with a scale."""
+    unit = unit.lower()
+    return "°" in unit or unit.startswith("degree") and unit.endswith(("c", "f", "celsius", "fahrenheit"))
+
+
+def _sentence(text: str, start: int, end: int) -> str:
+    """The sentence of `text` around the span start:end."""
+    begin = 0
+    for m in _SENTENCE_END.finditer(text, 0, start):
+        begin = m.end()
+    m = _SENTENCE_END.search(text, end)
+    return text[begin:m.start() if m else len(text)]
+
+
+def extract_claims(text: str) -> list[dict]:
+    """Numeric weather claims in free text, normalized to the units get_weather reports.
+
+    Each claim is a dict with: text, kind, value, tolerance. The tolerance
+    allows for the rounding implied by the number of decimals the claim uses,
+    plus GROUNDING_TOLERANCE.
+    """
+    claims = []
+    for m in _CLAIM.finditer(text):
+        unit = m.group(3).replace(" ", "")
+        kind, fahrenheit = _claim_kind(unit)
+        if not _is_explicit(unit) and not _CLAIM_CONTEXT[kind].search(_sentence(text, m.start(), m.end())):
+            continue
+        for raw in filter(None, (m.group(1), m.group(2))):
+            decimals = len(raw.split(".")[1]) if "." in raw else 0
+            value = float(raw)
+            tolerance = 0.5 * 10 ** -decimals + GROUNDING_TOLERANCE
+            if fahrenheit:
+                value = (value - 32) * 5 / 9
+                tolerance = tolerance * 5 / 9
+            claims.append({
+                "text": m.group(0).strip(),
+                "kind": kind,
+                "value": value,
+                "tolerance": tolerance,
+            })
+    return claims
+
+
+def extract_evidence(tool_outputs: list[dict]) -> dict[str, list[float]]:
+    """Weather values reported by the weather and destination tools, grouped by kind.
+
+    Reads the structured result when there is one and falls back to parsing
+    the rendered text otherwise.
+    """
+    evidence = {kind: [] for kind in _TOOL_UNIT_KIND.values()}
+    for t in tool_outputs:
+        data = t.get("data")
+        rows = data.rows if isinstance(data, WeatherComparison) else [data]
+        for row in rows:
+            if isinstance(row, WeatherResult):
+                for kind, fields in _RESULT_FIELDS.items():
+                    evidence[kind].extend(
+                        getattr(row, f) for f in fields if getattr(row, f) is not None
+                    )
+        if isinstance(data, DestinationsResult):
+            for match in data.matches:
+                evidence["temperature"].append(match.avg_temp)
+                evidence["precipitation"].append(match.precip)
+        if t["name"] in ("get_weather", "compare_weather") and data is None:
+            for m in _TOOL_VALUE.finditer(t["output"]):
+                evidence[_TOOL_UNIT_KIND[m.group(2)]].append(float(m.group(1)))
+    return evidence
+
+
+def ground_claims(tool_outputs: list[dict], agent_response: str) -> tuple[list[dict], list[dict]]:
+    """Match every numeric weather claim against the tool evidence.
+
+    Returns (claims, unmatched).
+    """
+    claims = extract_claims(agent_response)
+    evidence = extract_evidence(tool_outputs)
+    unmatched = [
+        c for c in claims
+        if not any(abs(c["value"] - v) <= c["tolerance"] for v in evidence[c["kind"]])
+    ]
+    return claims, unmatched
+
+
+def run_rule_supervisor(tool_outputs: list[dict], agent_response: str) -> dict:
+    """Deterministic supervisor: fail if any weather figure is not backed by get_weather.
+
+    Returns the same dict as run_supervisor(): passed (bool), verdict (str), reason (str)
+    """
+    with timer() as t:
+        claims, unmatched = ground_claims(tool_outputs, agent_response)
+
+    if unmatched:
+        shown = ", ".join(dict.fromkeys(c["text"] for c in unmatched))
+        reason = f"Weather figures not found in tool data: {shown}"
+        log_supervisor("FAIL", f"Rules: {reason}", t["elapsed_ms"])
+        return {"passed": False, "verdict": "FAIL", "reason": reason}
+
+    reason = "Weather figures match tool data" if claims else "No weather figures to verify"
+    log_supervisor("PASS", f"Rules: {reason}", t["elapsed_ms"])
+    return {"passed": True, "verdict": "PASS", "reason": reason}
+
+
+def precheck(tool_outputs: list[dict], agent_response: str) -> dict | None:
+    """Rule-based verdict when it is a clear PASS, else None so the LLM decides.
+
+    Unmatched figures are left to the LLM, which can tell a fabricated number
+    from one the rules merely failed to line up (e.g. an unusual phrasing).
+    """
+    with timer() as t:
+        claims, unmatched = ground_claims(tool_outputs, agent_response)
+    if unmatched:
+        return None
+
+    reason = "Weather figures match tool data" if claims else "No weather figures to verify"
+    log_supervisor("PASS", f"Rules: {reason}", t["elapsed_ms"])
+    return {"passed": True, "verdict": "PASS", "reason": reason}
+
+
+@traced("supervisor")
+def run_supervisor(
+    user_message: str,
+    tool_outputs: list[dict],
+    agent_response: str,
+    user_context: str = "",
+) -> dict:
+    """Validate the agent's response against tool evidence.
+
+    Returns dict with keys: passed (bool), verdict (str), reason (str), and
+    usage (input/output tokens) when the LLM was called.
+    """
+    if not tool_outputs:
+        return _no_tools_result()
+
+    if SUPERVISOR_ENGINE == "rules":
+        return run_rule_supervisor(tool_outputs, agent_response)
+    if SUPERVISOR_ENGINE == "hybrid":
+        pre = precheck(tool_outputs, agent_response)
+        if pre is not None:
+            return pre
+
+    check_prompt = _build_check_prompt(user_message, tool_outputs, agent_response, user_context)
+
+    try:
+        with timer() as t:
+            model = _get_model()
+            result = scheduler.call(
+                lambda: model.invoke(_check_messages(check_prompt)),
+                PRIORITY_SUPERVISOR,
+                _estimate_tokens(check_prompt),
+            )
+    except Exception as e:
+        return _unavailable_result(e)
+
+    return {**_parse_verdict(result.content, t["elapsed_ms"]), "usage": token_usage(result)}
+
+
+@traced("supervisor")
+async def arun_supervisor(
+    user_message: str,
+    tool_outputs: list[dict],
+    agent_response: str,
+    user_context: str = "",
+) -> dict:
+    """Async variant of run_supervisor()."""
+    if not tool_outputs:
+        return _no_tools_result()
+
+    if SUPERVISOR_ENGINE == "rules":
+        return run_rule_supervisor(tool_outputs, agent_response)
+    if SUPERVISOR_ENGINE == "hybrid":
+        pre = precheck(tool_outputs, agent_response)
+        if pre is not None:
+            return pre
+
+    check_prompt = _build_check_prompt(user_message, tool_outputs, agent_response, user_context)
+
+    try:
+        with timer() as t:
+            model = _get_model()
+            result = await scheduler.acall(
+                lambda: model.ainvoke(_check_messages(check_prompt)),
+                PRIORITY_SUPERVISOR,
+                _estimate_tokens(check_prompt),
+            )
+    except Exception as e:
+        return _unavailable_result(e)
+
+    return {**_parse_verdict(result.content, t["elapsed_ms"]), "usage": token_usage(result)}
+
+
+def submit_supervisor(
+    user_message: str,
+    tool_outputs: list[dict],
+    agent_response: str,
+    user_context: str = "",
+) -> Future:
+    """Start run_supervisor() in the background so the response can be delivered meanwhile."""
+    # Run in a copy of the caller's context so the span nests under the current turn.
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, run_supervisor, user_message, tool_outputs, agent_response, user_context)
@@ -0,0 +1,181 @@
+"""Tracing spans for turns, model calls, tool calls and the supervisor.
+
+    with span("tool.get_weather", city="Paris") as s:
+        ...
+    s["elapsed_ms"]
+
+Spans nest through a context variable, so a model or tool call made during a
+turn is recorded as that turn's child. Every span feeds a window of recent
+durations for its stage, summarized by stage_stats() as count/p50/p95/max.
+A sampled share of traces (TELEMETRY_SAMPLE_RATE, decided once per root span)
+is also written as JSON lines to TELEMETRY_PATH through the queue-based
+logging pipeline, so the request path never waits on file I/O.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from config import TELEMETRY_PATH, TELEMETRY_SAMPLE_RATE, TELEMETRY_WINDOW
+from logger import start_queue_logging, timer
+
+_exporter = logging.getLogger("trip_agent.telemetry")
+_exporter.propagate = False
+_exporter_ready = False
+_exporter_lock = threading.Lock()
+
+_current_span = contextvars.ContextVar("trip_agent_span", default=None)
+
+_durations: dict[str, deque] = {}
+_counts: dict[str, int] = {}
+_errors: dict[str, int] = {}
+_stats_lock = threading.Lock()
+
+
+class _JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.span, default=str, ensure_ascii=False)
+
+
+def _start_exporter() -> bool:
+    global _exporter_ready
+    if _exporter_ready or not TELEMETRY_PATH:
+        return _exporter_ready
+    with _exporter_lock:
+        if not _exporter_ready:
+            directory = os.path.dirname(TELEMETRY_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = logging.FileHandler(TELEMETRY_PATH, encoding="utf-8")
+            handler.setFormatter(_JsonLinesFormatter())
+            _exporter.setLevel(logging.INFO)
+            start_queue_logging(_exporter, handler)
+            _exporter_ready = True
+    return True
+
+
+def _record(name: str, elapsed_ms: float, failed: bool):
+    with _stats_lock:
+        window = _durations.get(name)
+        if window is None:
+            window = _durations[name] = deque(maxlen=TELEMETRY_WINDOW)
+            _counts[name] = _errors[name] = 0
+        window.append(elapsed_ms)
+        _counts[name] += 1
+        _errors[name] += failed
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a span named `name`.
+
+    Yields the timer() dict; elapsed_ms is filled in on exit, and entries
+    added to its "attrs" dict are exported with the span.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        trace_id, sampled = uuid.uuid4().hex, random.random() < TELEMETRY_SAMPLE_RATE
+    else:
+        trace_id, sampled = parent["trace_id"], parent["sampled"]
+    current = {"trace_id": trace_id, "span_id": uuid.uuid4().hex[:16], "sampled": sampled, "attrs": attrs}
+    token = _current_span.set(current)
+    started_at = time.time()
+    failed = False
+
+    try:
+        with timer() as t:
+            t["attrs"] = attrs
+            yield t
+    except GeneratorExit:
+        raise
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Exited from another context (e.g. a generator resumed elsewhere).
+            _current_span.set(parent)
+        _record(name, t["elapsed_ms"], failed)
+        if sampled and _start_exporter():
+            _exporter.info(name, extra={"span": {
+                "trace_id": trace_id,
+                "span_id": current["span_id"],
+                "parent_id": parent["span_id"] if parent else None,
+                "name": name,
+                "start": started_at,
+                "duration_ms": round(t["elapsed_ms"], 3),
+                "status": "error" if failed else "ok",
+                **attrs,
+            }})
+
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current["attrs"].update(attrs)
+
+
+def traced(name: str):
+    """Decorator running each call of a function, coroutine function or generator in a span."""
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with span(name):
+                    yield from fn(*args, **kwargs)
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with span(name):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted `values`."""
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
+
+
+def stage_stats() -> dict:
+    """{stage: {count, errors, p50_ms, p95_ms, max_ms}} over each stage's recent spans."""
+    with _stats_lock:
+        snapshot = {
+            name: (sorted(window), _counts[name], _errors[name])
+            for name, window in _durations.items()
+        }
+    return {
+        name: {
+            "count": count,
+            "errors": errors,
+            "p50_ms": round(_percentile(values, 50), 2),
+            "p95_ms": round(_percentile(values, 95), 2),
+            "max_ms": round(values[-1], 2),
+        }
+        for name, (values, count, errors) in sorted(snapshot.items())
+    }
+
+
+def reset_stats():
+    with _stats_lock:
+        _durations.clear()
+        _counts.clear()
+        _errors.clear()
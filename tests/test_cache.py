@@ -0,0 +1,57 @@
+"""tools.cache.TieredCache with a temporary on-disk tier."""
+import asyncio
+import sqlite3
+import time
+
+from tools.cache import MISSING, TieredCache
+
+
+class _BrokenDisk:
+    def get(self, namespace, key):
+        raise sqlite3.OperationalError("database is locked")
+
+    def set(self, namespace, key, value, expires_at):
+        raise sqlite3.OperationalError("database is locked")
+
+
+class _SlowDisk:
+    def get(self, namespace, key):
+        time.sleep(0.2)
+        return {"lat": 48.85}, time.time() + 60
+
+
+def test_disk_tier_survives_a_new_process(tmp_path):
+    db = str(tmp_path / "cache.sqlite3")
+    TieredCache("test", maxsize=10, ttl=60, db_path=db).set("paris", {"lat": 48.85})
+
+    cache = TieredCache("test", maxsize=10, ttl=60, db_path=db)
+    assert cache.get("paris") == {"lat": 48.85}
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_errors_are_misses(tmp_path):
+    cache = TieredCache("test", maxsize=10, ttl=60, db_path=str(tmp_path / "cache.sqlite3"))
+    cache._disk = _BrokenDisk()
+
+    assert cache.get("paris") is MISSING
+    cache.set("paris", {"lat": 48.85})
+    assert cache.get("paris") == {"lat": 48.85}
+    assert cache.stats()["misses"] == 1
+
+
+def test_async_disk_reads_do_not_block_the_loop(tmp_path):
+    cache = TieredCache("test", maxsize=10, ttl=60, db_path=str(tmp_path / "cache.sqlite3"))
+    cache._disk = _SlowDisk()
+    ticks = []
+
+    async def tick():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        return (await asyncio.gather(cache.aget("paris"), tick()))[0]
+
+    assert asyncio.run(run()) == {"lat": 48.85}
+    assert len(ticks) == 5 and ticks[-1] - ticks[0] < 0.15
+    assert cache.get("paris") == {"lat": 48.85}  # Now in the memory tier.
@@ -0,0 +1,99 @@
+"""tools/http.py against a local stub server whose behaviour each test switches."""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tools import http
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.hits += 1
+        if self.server.mode == "hang":
+            time.sleep(2)
+        status, payload = (200, b'{"ok": true}') if self.server.mode == "ok" else (503, b"{}")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.mode, server.hits = "ok", 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/data"
+
+
+def _open_breaker(server) -> http.CircuitBreaker:
+    breaker, _ = http._host_state(f"127.0.0.1:{server.server_address[1]}")
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    assert breaker.state == "open"
+    return breaker
+
+
+def _wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_success_closes_half_open_breaker(server):
+    breaker = _open_breaker(server)
+    breaker._opened_at -= breaker.reset_after
+
+    assert http.get_json(_url(server)) == {"ok": True}
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_rejects_without_request(server):
+    _open_breaker(server)
+
+    with pytest.raises(http.UpstreamError, match="temporarily unavailable"):
+        http.get_json(_url(server))
+    assert server.hits == 0
+
+
+def test_cancelled_half_open_trial_reopens_breaker(server):
+    breaker = _open_breaker(server)
+    breaker._opened_at -= breaker.reset_after
+    server.mode = "hang"
+
+    async def cancel_trial():
+        trial = asyncio.ensure_future(http.aget_json(_url(server)))
+        await asyncio.to_thread(_wait_for, lambda: server.hits == 1)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(cancel_trial())
+    # The abandoned trial counts as a failure on the HTTP loop.
+    _wait_for(lambda: breaker.state == "open")
+    assert not breaker._trial_in_flight
+
+    # Once the reset period passes again, a new trial goes through and closes the circuit.
+    breaker._opened_at -= breaker.reset_after
+    server.mode = "ok"
+    assert http.get_json(_url(server)) == {"ok": True}
+    assert breaker.state == "closed"
@@ -0,0 +1,92 @@
+"""middleware.ToolConcurrencyMiddleware with stand-in tool call requests."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import telemetry
+from middleware import ToolConcurrencyMiddleware
+
+
+def _request(thread_id: str, name: str = "get_weather"):
+    return SimpleNamespace(
+        tool_call={"name": name, "args": {}, "id": "call-1"},
+        runtime=SimpleNamespace(config={"configurable": {"thread_id": thread_id}}),
+    )
+
+
+class _Probe:
+    """A tool handler that records how many calls ran at once, per thread."""
+
+    def __init__(self, calls: int):
+        self.running, self.peak = {}, {}
+        self.lock = threading.Lock()
+        self.barrier = threading.Barrier(calls, timeout=0.5)
+
+    def __call__(self, request):
+        thread_id = request.runtime.config["configurable"]["thread_id"]
+        with self.lock:
+            self.running[thread_id] = self.running.get(thread_id, 0) + 1
+            self.peak[thread_id] = max(self.peak.get(thread_id, 0), self.running[thread_id])
+        try:
+            self.barrier.wait()
+        except threading.BrokenBarrierError:
+            pass  # Not every call could run at once.
+        with self.lock:
+            self.running[thread_id] -= 1
+        return "ok"
+
+
+def test_limit_applies_per_run():
+    middleware = ToolConcurrencyMiddleware({"get_weather": 2})
+    handler = _Probe(calls=6)
+    requests = [_request(f"t{i % 2}") for i in range(6)]
+
+    with ThreadPoolExecutor(6) as pool:
+        assert list(pool.map(lambda r: middleware.wrap_tool_call(r, handler), requests)) == ["ok"] * 6
+
+    assert handler.peak == {"t0": 2, "t1": 2}
+    assert middleware._semaphores == {}
+
+
+def test_async_limit_applies_per_run():
+    middleware = ToolConcurrencyMiddleware({"get_weather": 1})
+    running, peak = {}, {}
+
+    async def handler(request):
+        thread_id = request.runtime.config["configurable"]["thread_id"]
+        running[thread_id] = running.get(thread_id, 0) + 1
+        peak[thread_id] = max(peak.get(thread_id, 0), running[thread_id])
+        await asyncio.sleep(0.01)
+        running[thread_id] -= 1
+        return "ok"
+
+    async def run():
+        return await asyncio.gather(*(middleware.awrap_tool_call(_request(f"t{i % 2}"), handler) for i in range(4)))
+
+    assert asyncio.run(run()) == ["ok"] * 4
+    assert peak == {"t0": 1, "t1": 1}
+    assert middleware._semaphores == {}
+
+
+def test_unlimited_tool_is_not_throttled():
+    middleware = ToolConcurrencyMiddleware({"get_weather": 1})
+    assert middleware.wrap_tool_call(_request("t0", "find_destinations"), lambda request: "ok") == "ok"
+    assert middleware._semaphores == {}
+
+
+def test_wait_for_a_slot_is_traced():
+    telemetry.reset_stats()
+    middleware = ToolConcurrencyMiddleware({"get_weather": 1})
+
+    def slow(request):
+        time.sleep(0.05)
+        return "ok"
+
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(lambda r: middleware.wrap_tool_call(r, slow), [_request("t0"), _request("t0")]))
+
+    waits = telemetry.stage_stats()["tool.get_weather.wait"]
+    assert waits["count"] == 2
+    assert waits["max_ms"] >= 40
@@ -0,0 +1,26 @@
+"""profiles.ProfileStore with two instances over one store, as two workers would have."""
+from langgraph.store.memory import InMemoryStore
+
+from profiles import ProfileStore
+
+
+def test_save_preferences_merges_other_workers_writes():
+    store = InMemoryStore()
+    first, second = ProfileStore(store), ProfileStore(store)
+    first.save_preferences("u1", {"style": "beach"})
+    assert second.get_preferences("u1") == {"style": "beach"}  # Now cached in `second`.
+
+    first.save_preferences("u1", {"budget": "low"})
+    second.save_preferences("u1", {"diet": "vegan"})
+
+    assert store.get(("users", "u1"), "preferences").value == {"style": "beach", "budget": "low", "diet": "vegan"}
+
+
+def test_misses_are_cached_briefly():
+    store = InMemoryStore()
+    first, second = ProfileStore(store), ProfileStore(store, negative_ttl=0)
+    assert second.get_home_location("u1") is None
+
+    first.set_home_location("u1", {"city": "Lisbon"})
+
+    assert second.get_home_location("u1") == {"city": "Lisbon"}
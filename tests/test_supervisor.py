@@ -0,0 +1,56 @@
+"""The rule-based grounding checks in supervisor.py."""
+import pytest
+
+from supervisor import extract_claims, run_rule_supervisor
+from tools.results import WeatherResult
+
+_LISBON = WeatherResult(
+    city="Lisbon", country="Portugal", month=7,
+    avg_temp=24.6, max_temp=31.2, min_temp=18.0, total_precip=3.0, total_snow=0.0,
+)
+
+
+def _weather_output(result: WeatherResult = _LISBON) -> list[dict]:
+    return [{"name": "get_weather", "input": {}, "output": "", "data": result}]
+
+
+def _claims(text: str) -> list[tuple[str, float]]:
+    return [(c["kind"], round(c["value"], 1)) for c in extract_claims(text)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Highs reach 31.2°C.", [("temperature", 31.2)]),
+    ("Lisbon: 24.6 °C on average.", [("temperature", 24.6)]),
+    ("Around 25 degrees Celsius.", [("temperature", 25.0)]),
+    ("Highs reach 31.2 C in July.", [("temperature", 31.2)]),
+    ("Expect temperatures of 64-88 F.", [("temperature", 17.8), ("temperature", 31.1)]),
+    ("Daytime temperatures are around 25 degrees.", [("temperature", 25.0)]),
+    ("July is dry, with only 3 mm of rain.", [("precipitation", 3.0)]),
+    ("There's usually 0 cm of snow.", [("snowfall", 0.0)]),
+])
+def test_weather_claims_are_extracted(text, expected):
+    assert _claims(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "The tram climbs a 2 degree slope up to the castle.",
+    "Bring a 35 mm lens for the viewpoints.",
+    "The gap under the door is 2 cm.",
+    "Tram 28 runs every 10 min. Take line 15 C to Belém.",
+])
+def test_numbers_without_weather_context_are_not_claims(text):
+    assert extract_claims(text) == []
+
+
+def test_rules_pass_a_grounded_answer_with_other_numbers():
+    response = (
+        "Lisbon in July averages 24.6°C with highs of 31.2 C and just 3 mm of rain. "
+        "The walk up to the castle is a 12 degree climb, so bring 2 cm heel-free shoes."
+    )
+    assert run_rule_supervisor(_weather_output(), response)["verdict"] == "PASS"
+
+
+def test_rules_fail_an_invented_temperature():
+    result = run_rule_supervisor(_weather_output(), "Expect highs of 36 C in July.")
+    assert result["verdict"] == "FAIL"
+    assert "36 C" in result["reason"]
@@ -1,2 +1,3 @@
-from tools.weather import get_weather
-from tools.places import search_places
+from tools.weather import get_weather, compare_weather
+from tools.places import search_places, search_places_multi
+from tools.destinations import find_destinations
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import CACHE_DB_PATH
+
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache where every entry carries its own expiry."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class _SQLiteBackend:
+    """Shared on-disk tier. One connection per process, serialized with a lock."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                return MISSING, 0.0
+            value, expires_at = row
+            if expires_at < time.time():
+                self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+                )
+                return MISSING, 0.0
+        return json.loads(value), expires_at
+
+    def set(self, namespace: str, key: str, value, expires_at: float):
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, payload, expires_at),
+            )
+
+    def delete_expired(self, namespace: str) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND expires_at < ?",
+                (namespace, time.time()),
+            )
+        return cur.rowcount
+
+    def clear(self, namespace: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+
+_backends: dict[str, _SQLiteBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def _get_backend(path: str) -> _SQLiteBackend | None:
+    if not path:
+        return None
+    with _backends_lock:
+        if path not in _backends:
+            try:
+                _backends[path] = _SQLiteBackend(path)
+            except sqlite3.Error:
+                return None
+        return _backends[path]
+
+
+class TieredCache:
+    """In-process LRU tier in front of a persistent SQLite tier, with TTL expiry.
+
+    A value of None is a negative entry ("looked up, does not exist") and is kept
+    for `negative_ttl` seconds instead of `ttl`. Values must be JSON-serializable.
+    Coroutines use aget()/aset(), which do the SQLite I/O in a worker thread so
+    a slow or busy DB never stalls the event loop.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int,
+        ttl: float,
+        negative_ttl: float | None = None,
+        db_path: str | None = CACHE_DB_PATH,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._memory = LRUCache(maxsize)
+        self._disk = _get_backend(db_path)
+        self._stats_lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "negative_hits": 0, "misses": 0}
+
+    def _count(self, counter: str):
+        with self._stats_lock:
+            self._stats[counter] += 1
+
+    def _from_memory(self, key: str):
+        value = self._memory.get(key)
+        if value is not MISSING:
+            self._count("memory_hits")
+        return value
+
+    def _from_disk(self, key: str):
+        try:
+            value, expires_at = self._disk.get(self.namespace, key)
+        except sqlite3.Error:
+            # A locked, busy or corrupt cache DB is a miss, not a failed lookup.
+            return MISSING
+        if value is not MISSING:
+            self._count("disk_hits")
+            self._memory.set(key, value, expires_at - time.time())
+        return value
+
+    def _result(self, value, default):
+        if value is MISSING:
+            self._count("misses")
+            return default
+        if value is None:
+            self._count("negative_hits")
+        return value
+
+    def _to_disk(self, key: str, value, ttl: float):
+        try:
+            self._disk.set(self.namespace, key, value, time.time() + ttl)
+        except sqlite3.Error:
+            pass
+
+    def _ttl(self, value) -> float:
+        return self.negative_ttl if value is None else self.ttl
+
+    def get(self, key: str, default=MISSING):
+        value = self._from_memory(key)
+        if value is MISSING and self._disk is not None:
+            value = self._from_disk(key)
+        return self._result(value, default)
+
+    async def aget(self, key: str, default=MISSING):
+        value = self._from_memory(key)
+        if value is MISSING and self._disk is not None:
+            value = await asyncio.to_thread(self._from_disk, key)
+        return self._result(value, default)
+
+    def set(self, key: str, value):
+        ttl = self._ttl(value)
+        self._memory.set(key, value, ttl)
+        if self._disk is not None:
+            self._to_disk(key, value, ttl)
+
+    async def aset(self, key: str, value):
+        ttl = self._ttl(value)
+        self._memory.set(key, value, ttl)
+        if self._disk is not None:
+            await asyncio.to_thread(self._to_disk, key, value, ttl)
+
+    def purge_expired(self) -> int:
+        """Drop expired rows from the on-disk tier. Returns the number removed."""
+        if self._disk is None:
+            return 0
+        return self._disk.delete_expired(self.namespace)
+
+    def clear(self):
+        """Drop every entry from both tiers."""
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear(self.namespace)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["size"] = len(self._memory)
+        return stats
+
+
+def normalize_key(*parts: str | None) -> str:
+    """Build a cache key that ignores case and surrounding/duplicate whitespace."""
+    return "|".join(" ".join((p or "").split()).casefold() for p in parts)
@@ -0,0 +1,168 @@
+"""Destination candidates from the local index in data/destinations.json.
+
+The index is loaded once into NumPy arrays: monthly temperature and
+precipitation normals (one row per city) and a boolean tag matrix. A query is
+a handful of vectorized masks plus one scoring pass, so it takes well under a
+millisecond and never calls an API.
+"""
+import json
+import threading
+
+import numpy as np
+from langchain_core.tools import StructuredTool
+
+from config import DESTINATIONS_PATH, DESTINATIONS_MAX_RESULTS
+from tools.cache import normalize_key
+from tools.results import DestinationMatch, DestinationsResult, ToolError, render
+
+# interest: (required tag, ideal mean °C, default comfortable range of the monthly mean)
+INTERESTS = {
+    "beach": ("beach", 27.0, (22.0, 34.0)),
+    "skiing": ("ski", -3.0, (-20.0, 3.0)),
+    "hiking": ("mountains", 16.0, (5.0, 26.0)),
+    "city": ("city", 20.0, (0.0, 32.0)),
+    "culture": ("culture", 20.0, (0.0, 32.0)),
+    "food": ("food", 21.0, (0.0, 33.0)),
+    "nightlife": ("nightlife", 22.0, (5.0, 33.0)),
+    "nature": ("nature", 17.0, (0.0, 30.0)),
+}
+
+_ALIASES = {
+    "beaches": "beach", "swimming": "beach", "sun": "beach", "island": "beach",
+    "ski": "skiing", "snowboarding": "skiing", "snow": "skiing",
+    "mountains": "hiking", "trekking": "hiking", "outdoors": "hiking",
+    "sightseeing": "culture", "museums": "culture", "history": "culture",
+    "cuisine": "food", "local food": "food", "party": "nightlife", "bars": "nightlife",
+    "city break": "city", "wildlife": "nature",
+}
+
+# How many °C of distance from the ideal one 100 mm of monthly precipitation costs.
+_PRECIP_WEIGHT = 4.0
+
+_index: dict | None = None
+_index_lock = threading.Lock()
+
+
+def _load_index() -> dict:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                with open(DESTINATIONS_PATH, encoding="utf-8") as f:
+                    entries = json.load(f)["destinations"]
+                tags = sorted({t for e in entries for t in e["tags"]})
+                _index = {
+                    "entries": entries,
+                    "names": [normalize_key(e["city"]) for e in entries],
+                    "regions": np.array([normalize_key(e["region"]) for e in entries]),
+                    "temp": np.array([e["temp"] for e in entries], dtype=np.float32),
+                    "precip": np.array([e["precip"] for e in entries], dtype=np.float32),
+                    "tag_names": {t: i for i, t in enumerate(tags)},
+                    "tags": np.array([[t in e["tags"] for t in tags] for e in entries], dtype=bool),
+                }
+    return _index
+
+
+def _resolve_interest(interest: str) -> str | None:
+    key = normalize_key(interest)
+    return key if key in INTERESTS else _ALIASES.get(key)
+
+
+def find_destinations_result(
+    interest: str,
+    month: int,
+    min_temp: float | None = None,
+    max_temp: float | None = None,
+    max_precip: float | None = None,
+    region: str | None = None,
+    exclude: list[str] | None = None,
+    limit: int = 5,
+) -> DestinationsResult | ToolError:
+    """Destinations suited to `interest` in `month`, best first.
+
+    Cities must carry the interest's tag and have a monthly mean temperature
+    within [min_temp, max_temp] (the interest's comfortable range by default).
+    They are ranked by distance from the interest's ideal temperature, with
+    wetter months penalized.
+    """
+    name = _resolve_interest(interest)
+    if name is None:
+        return ToolError(f"Unknown interest '{interest}'. Use one of: {', '.join(INTERESTS)}.")
+    if not 1 <= month <= 12:
+        return ToolError(f"Invalid month {month}. Use 1-12.")
+
+    index = _load_index()
+    tag, ideal, (low, high) = INTERESTS[name]
+    temp = index["temp"][:, month - 1]
+    precip = index["precip"][:, month - 1]
+
+    mask = index["tags"][:, index["tag_names"][tag]].copy()
+    mask &= temp >= (low if min_temp is None else min_temp)
+    mask &= temp <= (high if max_temp is None else max_temp)
+    if max_precip is not None:
+        mask &= precip <= max_precip
+    if region:
+        mask &= index["regions"] == normalize_key(region)
+    if exclude:
+        excluded = {normalize_key(city) for city in exclude}
+        mask &= np.array([n not in excluded for n in index["names"]])
+
+    candidates = np.flatnonzero(mask)
+    score = np.abs(temp[candidates] - ideal) + precip[candidates] * (_PRECIP_WEIGHT / 100)
+    top = candidates[np.argsort(score, kind="stable")[: max(1, min(limit, DESTINATIONS_MAX_RESULTS))]]
+
+    matches = [
+        DestinationMatch(
+            city=index["entries"][i]["city"],
+            country=index["entries"][i]["country"],
+            avg_temp=round(float(temp[i]), 1),
+            precip=round(float(precip[i]), 1),
+            tags=[t for t in index["entries"][i]["tags"] if t != "coastal"],
+        )
+        for i in top
+    ]
+    return DestinationsResult(interest=name, month=month, matches=matches)
+
+
+def _find_destinations(
+    interest: str,
+    month: int,
+    min_temp: float | None = None,
+    max_temp: float | None = None,
+    max_precip: float | None = None,
+    region: str | None = None,
+    exclude: list[str] | None = None,
+    limit: int = 5,
+) -> tuple[str, DestinationsResult | ToolError]:
+    """Suggest destinations for an interest and month from a local index of cities.
+
+    Use this tool FIRST when the user hasn't picked a destination yet, to get
+    candidates that actually fit (e.g. only coastal cities for a beach trip,
+    only ski resorts for skiing). Returns long-term average temperature and
+    precipitation per city; use get_weather or compare_weather for details.
+
+    Args:
+        interest: One of "beach", "skiing", "hiking", "city", "culture", "food", "nightlife", "nature"
+        month: The month number (1-12, where 1=January, 12=December)
+        min_temp: Optional lowest acceptable average temperature in °C
+        max_temp: Optional highest acceptable average temperature in °C
+        max_precip: Optional highest acceptable monthly precipitation in mm
+        region: Optional continent: "Europe", "Asia", "Africa", "North America", "South America" or "Oceania"
+        exclude: Optional city names to leave out (e.g. ones already suggested)
+        limit: How many destinations to return (default 5, max 10)
+    """
+    result = find_destinations_result(interest, month, min_temp, max_temp, max_precip, region, exclude, limit)
+    return render(result), result
+
+
+async def _afind_destinations(*args, **kwargs) -> tuple[str, DestinationsResult | ToolError]:
+    # Local and sub-millisecond: run inline instead of in a worker thread.
+    return _find_destinations(*args, **kwargs)
+
+
+find_destinations = StructuredTool.from_function(
+    func=_find_destinations,
+    coroutine=_afind_destinations,
+    name="find_destinations",
+    response_format="content_and_artifact",
+)
@@ -0,0 +1,296 @@
+"""Shared, pooled and fault-tolerant HTTP client for the tools.
+
+Every upstream request goes through one keep-alive httpx.AsyncClient that
+lives on a dedicated background event loop. Async callers (on any loop) await
+it there, and sync callers block on it via run_sync(), so both share a single
+connection pool and the same per-host connection limits.
+
+On top of the pool, each logical GET:
+
+- must finish within its host's latency budget (HTTP_ENDPOINT_BUDGETS),
+  retries and hedges included;
+- is retried with jittered backoff on timeouts, connection errors, 429 and
+  5xx responses, while the budget allows;
+- may be hedged: if the first attempt hasn't answered after
+  HTTP_HEDGE_AFTER[host], a second copy is sent and the faster one wins;
+- fails fast while its host's circuit breaker is open, i.e. after
+  HTTP_BREAKER_FAILURES consecutive failures.
+
+Per-host counters are available from http_stats().
+"""
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_ENDPOINT_BUDGETS,
+    HTTP_DEFAULT_BUDGET,
+    HTTP_MAX_RETRIES,
+    HTTP_RETRY_BACKOFF,
+    HTTP_HEDGE_AFTER,
+    HTTP_BREAKER_FAILURES,
+    HTTP_BREAKER_RESET,
+)
+
+
+class UpstreamError(Exception):
+    """An upstream API request failed (network error, timeout or non-2xx status)."""
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_thread: threading.Thread | None = None
+_loop_lock = threading.Lock()
+
+# Only touched from the background loop.
+_client: httpx.AsyncClient | None = None
+_host_semaphores: dict[str, asyncio.Semaphore] = {}
+_breakers: dict[str, "CircuitBreaker"] = {}
+_counters: dict[str, dict[str, int]] = {}
+
+_COUNTERS = ("requests", "attempts", "retries", "hedges", "hedge_wins", "failures", "timeouts", "rejected")
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """Closed → open after `threshold` consecutive failures → half-open after `reset_after` s.
+
+    While half-open a single trial request is let through: success closes the
+    circuit again, failure re-opens it.
+    """
+
+    def __init__(self, threshold: int = HTTP_BREAKER_FAILURES, reset_after: float = HTTP_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_after:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(
+                target=_loop.run_forever, name="tools-http", daemon=True
+            )
+            _loop_thread.start()
+        return _loop
+
+
+def _on_http_loop() -> bool:
+    return _loop_thread is not None and threading.current_thread() is _loop_thread
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+
+def _host_semaphore(host: str) -> asyncio.Semaphore:
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(HTTP_MAX_CONNECTIONS_PER_HOST)
+    return _host_semaphores[host]
+
+
+def _host_state(host: str) -> tuple["CircuitBreaker", dict[str, int]]:
+    if host not in _breakers:
+        _breakers[host] = CircuitBreaker()
+        _counters[host] = dict.fromkeys(_COUNTERS, 0)
+    return _breakers[host], _counters[host]
+
+
+async def _attempt(url: str, host: str, params: dict | None, headers: dict | None, timeout: float):
+    async with _host_semaphore(host):
+        resp = await asyncio.wait_for(
+            _get_client().get(url, params=params, headers=headers, timeout=timeout), timeout
+        )
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def _hedged_attempt(url, host, params, headers, timeout: float, counters: dict):
+    """One attempt, duplicated after HTTP_HEDGE_AFTER[host] if still unanswered."""
+    hedge_after = HTTP_HEDGE_AFTER.get(host)
+    if hedge_after is None or hedge_after >= timeout:
+        return await _attempt(url, host, params, headers, timeout)
+
+    first = asyncio.ensure_future(_attempt(url, host, params, headers, timeout))
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return first.result()
+
+        counters["hedges"] += 1
+        second = asyncio.ensure_future(_attempt(url, host, params, headers, timeout - hedge_after))
+        pending.add(second)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        counters["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _classify(error: Exception) -> tuple[bool, bool]:
+    """(worth retrying, counts against the host's health) for an attempt's error."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status in _RETRYABLE_STATUS, status in _RETRYABLE_STATUS
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True, True
+    # Malformed body from a 2xx response.
+    return False, True
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    delay = random.uniform(0, HTTP_RETRY_BACKOFF * 2 ** attempt)
+    if isinstance(error, httpx.HTTPStatusError):
+        try:
+            delay = max(delay, float(error.response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return delay
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "request timed out"
+    return str(error) or type(error).__name__
+
+
+async def _fetch_json(url: str, params: dict | None, headers: dict | None, budget: float | None):
+    host = urlsplit(url).netloc
+    breaker, counters = _host_state(host)
+    counters["requests"] += 1
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (budget or HTTP_ENDPOINT_BUDGETS.get(host, HTTP_DEFAULT_BUDGET))
+
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        if not breaker.allow():
+            counters["rejected"] += 1
+            raise UpstreamError(f"{host} is temporarily unavailable (too many recent failures)")
+        trial = breaker.state == "half_open"
+
+        counters["attempts"] += 1
+        try:
+            data = await _hedged_attempt(
+                url, host, params, headers, deadline - loop.time(), counters
+            )
+        except Exception as e:
+            retryable, unhealthy = _classify(e)
+            if unhealthy:
+                breaker.record_failure()
+                counters["failures"] += 1
+            else:
+                breaker.record_success()
+            if isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException)):
+                counters["timeouts"] += 1
+
+            delay = _retry_delay(e, attempt)
+            if not retryable or attempt == HTTP_MAX_RETRIES or loop.time() + delay >= deadline:
+                raise UpstreamError(_describe(e)) from e
+            counters["retries"] += 1
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Cancelled (e.g. the caller went away): an abandoned half-open trial
+            # counts as a failure, or the breaker would wait for it forever.
+            if trial:
+                breaker.record_failure()
+            raise
+
+        breaker.record_success()
+        return data
+
+
+async def on_http_loop(coro):
+    """Await a coroutine on the shared HTTP loop from any other event loop."""
+    if _on_http_loop():
+        return await coro
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    return await asyncio.wrap_future(future)
+
+
+def run_sync(coro):
+    """Run a coroutine on the shared HTTP loop and block until it finishes."""
+    if _on_http_loop():
+        coro.close()
+        raise RuntimeError("run_sync() called from the HTTP loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+async def aget_json(url: str, params: dict | None = None, headers: dict | None = None, budget: float | None = None):
+    """GET a JSON document over the pooled client. Raises UpstreamError on failure.
+
+    `budget` overrides the host's latency budget from HTTP_ENDPOINT_BUDGETS.
+    """
+    return await on_http_loop(_fetch_json(url, params, headers, budget))
+
+
+def get_json(url: str, params: dict | None = None, headers: dict | None = None, budget: float | None = None):
+    """Blocking variant of aget_json()."""
+    return run_sync(_fetch_json(url, params, headers, budget))
+
+
+def http_stats() -> dict:
+    """Per-host request counters and circuit breaker state."""
+    return {
+        host: {**counters, "circuit": _breakers[host].state}
+        for host, counters in list(_counters.items())
+    }
+
+
+def close():
+    """Close pooled connections. A later request transparently opens new ones."""
+    global _client
+    if _loop is None or _client is None:
+        return
+    client, _client = _client, None
+    asyncio.run_coroutine_threadsafe(client.aclose(), _loop).result()
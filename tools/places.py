@@ -1,12 +1,162 @@
-import requests
-from langchain.tools import tool
+import asyncio
 
-from config import FOURSQUARE_API_KEY, FOURSQUARE_BASE_URL
-from tools.weather import _geocode_city
+from langchain_core.tools import StructuredTool
 
+from config import (
+    FOURSQUARE_API_KEY,
+    FOURSQUARE_BASE_URL,
+    PLACES_CACHE_SIZE,
+    PLACES_CACHE_TTL,
+    PLACES_CACHE_DECIMALS,
+    PLACES_MAX_CATEGORIES,
+)
+from tools.cache import MISSING, TieredCache, normalize_key
+from tools.http import UpstreamError, aget_json, run_sync
+from tools.singleflight import SingleFlight
+from tools.results import MultiPlacesResult, Place, PlacesResult, ToolError, render
+from tools.weather import _ageocode_city
 
-@tool
-def search_places(city: str, category: str) -> str:
+_places_cache = TieredCache(
+    "places",
+    maxsize=PLACES_CACHE_SIZE,
+    ttl=PLACES_CACHE_TTL,
+)
+_places_flight = SingleFlight("places")
+
+
+def places_cache_stats() -> dict:
+    """Hit/miss counters for the places cache."""
+    return _places_cache.stats()
+
+
+def _places_key(latitude: float, longitude: float, category: str) -> str:
+    d = PLACES_CACHE_DECIMALS
+    return f"{latitude:.{d}f},{longitude:.{d}f}:{normalize_key(category)}"
+
+
+async def _afetch_places(latitude: float, longitude: float, category: str) -> list[dict]:
+    """Top Foursquare places for one category around a point, as Place fields."""
+    headers = {
+        "Authorization": f"Bearer {FOURSQUARE_API_KEY}",
+        "Accept": "application/json",
+        "X-Places-Api-Version": "2025-06-17",
+    }
+    params = {
+        "query": category,
+        "ll": f"{latitude},{longitude}",
+        "radius": 30000,
+        "limit": 5,
+        "sort": "POPULARITY",
+    }
+    data = await aget_json(FOURSQUARE_BASE_URL, params=params, headers=headers)
+    return [
+        {
+            "name": place.get("name", "Unknown"),
+            "categories": [c.get("name", "") for c in place.get("categories", []) if c.get("name")],
+            "address": place.get("location", {}).get("formatted_address", "Address not available"),
+        }
+        for place in data.get("results", [])
+    ]
+
+
+async def _aget_places(geo: dict, category: str) -> list[Place]:
+    """Places for one category near a geocoded city, served from the places cache when possible.
+
+    Raises UpstreamError on API failure; failures are not cached. Concurrent
+    misses for the same key share one Foursquare request.
+    """
+    key = _places_key(geo["latitude"], geo["longitude"], category)
+    cached = await _places_cache.aget(key)
+    if cached is MISSING:
+        async def fetch():
+            places = await _afetch_places(geo["latitude"], geo["longitude"], category)
+            await _places_cache.aset(key, places)
+            return places
+
+        cached = await _places_flight.call(key, fetch)
+    return [Place(**p) for p in cached]
+
+
+def _places_result(city: str, geo: dict, category: str, places: list[Place]) -> PlacesResult:
+    # Keep the user's spelling when nothing was found, as the message refers back to it.
+    found_city = geo["name"] if places else city
+    return PlacesResult(city=found_city, country=geo["country"], category=category, places=places)
+
+
+async def aplaces_result(city: str, category: str) -> PlacesResult | ToolError:
+    """Structured top places for one category in a city."""
+    if not FOURSQUARE_API_KEY:
+        return ToolError("Error: FOURSQUARE_API_KEY is not set. Please add it to your .env file.")
+
+    try:
+        geo = await _ageocode_city(city)
+    except ValueError as e:
+        return ToolError(str(e))
+    except UpstreamError as e:
+        return ToolError(f"Geocoding API error for {city}: {e}")
+
+    try:
+        places = await _aget_places(geo, category)
+    except UpstreamError as e:
+        return ToolError(f"Foursquare API error: {e}")
+
+    return _places_result(city, geo, category, places)
+
+
+async def amulti_places_result(city: str, categories: list[str]) -> MultiPlacesResult | ToolError:
+    """Structured top places for several categories in a city.
+
+    The city is geocoded once and the categories are searched concurrently.
+    A place found under several categories is only listed under the first.
+    """
+    if not FOURSQUARE_API_KEY:
+        return ToolError("Error: FOURSQUARE_API_KEY is not set. Please add it to your .env file.")
+    unique_categories = {}
+    for category in categories:
+        if category.strip():
+            unique_categories.setdefault(normalize_key(category), category.strip())
+    categories = list(unique_categories.values())[:PLACES_MAX_CATEGORIES]
+    if not categories:
+        return ToolError("No categories to search.")
+
+    try:
+        geo = await _ageocode_city(city)
+    except ValueError as e:
+        return ToolError(str(e))
+    except UpstreamError as e:
+        return ToolError(f"Geocoding API error for {city}: {e}")
+
+    found = await asyncio.gather(
+        *(_aget_places(geo, category) for category in categories), return_exceptions=True
+    )
+    results, not_searched, seen = [], [], set()
+    for category, places in zip(categories, found):
+        if isinstance(places, UpstreamError):
+            not_searched.append(f"{category} (Foursquare API error: {places})")
+            continue
+        if isinstance(places, BaseException):
+            raise places
+        unique = []
+        for place in places:
+            key = normalize_key(place.name, place.address)
+            if key not in seen:
+                seen.add(key)
+                unique.append(place)
+        if places and not unique:
+            continue  # Everything was already listed under an earlier category.
+        results.append(_places_result(city, geo, category, unique))
+
+    if not results:
+        return ToolError(f"Could not search {city}: {'; '.join(not_searched)}")
+    return MultiPlacesResult(city=geo["name"], country=geo["country"], results=results, not_searched=not_searched)
+
+
+async def _asearch_places(city: str, category: str) -> tuple[str, PlacesResult | ToolError]:
+    result = await aplaces_result(city, category)
+    return render(result), result
+
+
+def _search_places(city: str, category: str) -> tuple[str, PlacesResult | ToolError]:
     """Search for places and activities at a destination city.
 
     Use this tool when you need to find things to do, restaurants, attractions,
@@ -26,50 +176,38 @@ def search_places(city: str, category: str) -> str:
             - "spa" or "wellness"
             - "historical site" or "landmark"
     """
-    if not FOURSQUARE_API_KEY:
-        return "Error: FOURSQUARE_API_KEY is not set. Please add it to your .env file."
+    return run_sync(_asearch_places(city, category))
 
-    try:
-        geo = _geocode_city(city)
-    except ValueError as e:
-        return str(e)
 
-    headers = {
-        "Authorization": f"Bearer {FOURSQUARE_API_KEY}",
-        "Accept": "application/json",
-        "X-Places-Api-Version": "2025-06-17",
-    }
-    params = {
-        "query": category,
-        "ll": f"{geo['latitude']},{geo['longitude']}",
-        "radius": 30000,
-        "limit": 5,
-        "sort": "POPULARITY",
-    }
+async def _asearch_places_multi(city: str, categories: list[str]) -> tuple[str, MultiPlacesResult | ToolError]:
+    result = await amulti_places_result(city, categories)
+    return render(result), result
 
-    try:
-        resp = requests.get(
-            FOURSQUARE_BASE_URL, headers=headers, params=params, timeout=10
-        )
-        resp.raise_for_status()
-        data = resp.json()
-    except requests.RequestException as e:
-        return f"Foursquare API error: {e}"
-
-    results = data.get("results", [])
-    if not results:
-        return f"No {category} found in {city}. Try a different category or nearby city."
-
-    lines = [f"Top {category} in {geo['name']}, {geo['country']}:\n"]
-    for i, place in enumerate(results, 1):
-        name = place.get("name", "Unknown")
-        cats = ", ".join(
-            c.get("name", "") for c in place.get("categories", [])
-        )
-        addr = place.get("location", {}).get("formatted_address", "Address not available")
-        lines.append(f"  {i}. {name}")
-        if cats:
-            lines.append(f"     Category: {cats}")
-        lines.append(f"     Address: {addr}")
-
-    return "\n".join(lines)
+
+def _search_places_multi(city: str, categories: list[str]) -> tuple[str, MultiPlacesResult | ToolError]:
+    """Search for places in several categories at one destination city in a single call.
+
+    Use this tool instead of several search_places calls when the user wants
+    a mix of things to do (e.g. "things to do in Barcelona"). Each place is
+    listed once, under the first category it was found in.
+
+    Args:
+        city: The city to search in (e.g., "Innsbruck", "Barcelona", "Tokyo")
+        categories: Up to 5 categories (e.g., ["museum", "beach", "local food"])
+    """
+    return run_sync(_asearch_places_multi(city, categories))
+
+
+search_places = StructuredTool.from_function(
+    func=_search_places,
+    coroutine=_asearch_places,
+    name="search_places",
+    response_format="content_and_artifact",
+)
+
+search_places_multi = StructuredTool.from_function(
+    func=_search_places_multi,
+    coroutine=_asearch_places_multi,
+    name="search_places_multi",
+    response_format="content_and_artifact",
+)
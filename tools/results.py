@@ -0,0 +1,234 @@
+"""Structured tool results and the single place they are rendered for the LLM.
+
+Tools return (render(result), result): the model sees the text, while the
+agent, supervisor, logging and UI read the typed result from the ToolMessage
+artifact. Checkpointers may hand artifacts back as plain dicts, so readers
+should go through coerce_result().
+"""
+from dataclasses import asdict, dataclass, field, is_dataclass
+
+from config import CLIMATE_YEAR
+
+MONTH_NAMES = [
+    "", "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+]
+
+
+@dataclass(slots=True)
+class ToolError:
+    """A tool call that could not produce data (unknown city, API failure, ...)."""
+
+    message: str
+    error: bool = True
+
+
+@dataclass(slots=True)
+class WeatherResult:
+    city: str
+    country: str
+    month: int
+    avg_temp: float | None
+    max_temp: float | None
+    min_temp: float | None
+    total_precip: float | None
+    total_snow: float | None
+
+
+@dataclass(slots=True)
+class WeatherComparison:
+    """Several cities' climate in one month, ranked by `rank_by`."""
+
+    month: int
+    rank_by: str
+    rows: list[WeatherResult] = field(default_factory=list)
+    not_compared: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class DestinationMatch:
+    city: str
+    country: str
+    avg_temp: float
+    precip: float
+    tags: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class DestinationsResult:
+    """Best-matching destinations from the local index, using climate normals for `month`."""
+
+    interest: str
+    month: int
+    matches: list[DestinationMatch] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class Place:
+    name: str
+    categories: list[str] = field(default_factory=list)
+    address: str = ""
+
+
+@dataclass(slots=True)
+class PlacesResult:
+    city: str
+    country: str
+    category: str
+    places: list[Place] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class MultiPlacesResult:
+    """Places for several categories in one city; each place is listed only once."""
+
+    city: str
+    country: str
+    results: list[PlacesResult] = field(default_factory=list)
+    not_searched: list[str] = field(default_factory=list)
+
+
+def _fmt(value) -> str:
+    return "N/A" if value is None else str(value)
+
+
+def render(result) -> str:
+    """Text shown to the LLM for a tool result."""
+    if isinstance(result, ToolError):
+        return result.message
+
+    if isinstance(result, WeatherResult):
+        return (
+            f"Climate data for {result.city}, {result.country} in {MONTH_NAMES[result.month]} {CLIMATE_YEAR} "
+            f"(one model year, not a long-term average):\n"
+            f"  Average Temperature: {_fmt(result.avg_temp)}°C\n"
+            f"  Max Temperature: {_fmt(result.max_temp)}°C\n"
+            f"  Min Temperature: {_fmt(result.min_temp)}°C\n"
+            f"  Total Precipitation: {_fmt(result.total_precip)} mm\n"
+            f"  Total Snowfall: {_fmt(result.total_snow)} cm\n"
+        )
+
+    if isinstance(result, WeatherComparison):
+        lines = [
+            f"Climate comparison for {MONTH_NAMES[result.month]} {CLIMATE_YEAR} "
+            f"(one model year, not a long-term average), {result.rank_by} first:",
+            "  # | City | Avg | Max | Min | Precipitation | Snowfall",
+        ]
+        for i, row in enumerate(result.rows, 1):
+            lines.append(
+                f"  {i} | {row.city}, {row.country} | {_fmt(row.avg_temp)}°C | "
+                f"{_fmt(row.max_temp)}°C | {_fmt(row.min_temp)}°C | "
+                f"{_fmt(row.total_precip)} mm | {_fmt(row.total_snow)} cm"
+            )
+        if result.not_compared:
+            lines.append(f"Not compared: {'; '.join(result.not_compared)}")
+        return "\n".join(lines)
+
+    if isinstance(result, DestinationsResult):
+        if not result.matches:
+            return (
+                f"No destinations for {result.interest} in {MONTH_NAMES[result.month]} match "
+                "these constraints. Try relaxing them or a different month."
+            )
+        lines = [f"Destinations for {result.interest} in {MONTH_NAMES[result.month]} (climate normals, best first):"]
+        for i, m in enumerate(result.matches, 1):
+            lines.append(
+                f"  {i}. {m.city}, {m.country}: avg {m.avg_temp}°C, {m.precip} mm precipitation "
+                f"({', '.join(m.tags)})"
+            )
+        return "\n".join(lines)
+
+    if isinstance(result, PlacesResult):
+        if not result.places:
+            return f"No {result.category} found in {result.city}. Try a different category or nearby city."
+        lines = [f"Top {result.category} in {result.city}, {result.country}:\n"]
+        for i, place in enumerate(result.places, 1):
+            lines.append(f"  {i}. {place.name}")
+            if place.categories:
+                lines.append(f"     Category: {', '.join(place.categories)}")
+            lines.append(f"     Address: {place.address}")
+        return "\n".join(lines)
+
+    if isinstance(result, MultiPlacesResult):
+        sections = [render(r) for r in result.results]
+        if result.not_searched:
+            sections.append(f"Not searched: {'; '.join(result.not_searched)}")
+        return "\n\n".join(sections)
+
+    raise TypeError(f"Cannot render {type(result).__name__}")
+
+
+def render_compact(result) -> str:
+    """One-line form of a result, used where tokens matter more than readability."""
+    if isinstance(result, ToolError):
+        return f"error: {result.message}"
+
+    if isinstance(result, WeatherResult):
+        return (
+            f"{result.city}, {result.country}, {MONTH_NAMES[result.month][:3]} {CLIMATE_YEAR}: "
+            f"avg {_fmt(result.avg_temp)}°C, max {_fmt(result.max_temp)}°C, "
+            f"min {_fmt(result.min_temp)}°C, precip {_fmt(result.total_precip)}mm, "
+            f"snow {_fmt(result.total_snow)}cm"
+        )
+
+    if isinstance(result, WeatherComparison):
+        ranked = "; ".join(
+            f"{i}. {row.city} avg {_fmt(row.avg_temp)}°C precip {_fmt(row.total_precip)}mm "
+            f"snow {_fmt(row.total_snow)}cm"
+            for i, row in enumerate(result.rows, 1)
+        )
+        return f"{MONTH_NAMES[result.month][:3]} {CLIMATE_YEAR}, {result.rank_by} first: {ranked or 'no data'}"
+
+    if isinstance(result, DestinationsResult):
+        found = "; ".join(f"{m.city} {m.avg_temp}°C {m.precip}mm" for m in result.matches) or "none found"
+        return f"{result.interest} in {MONTH_NAMES[result.month][:3]}: {found}"
+
+    if isinstance(result, PlacesResult):
+        names = "; ".join(p.name for p in result.places) or "none found"
+        return f"{result.category} in {result.city}, {result.country}: {names}"
+
+    if isinstance(result, MultiPlacesResult):
+        return " | ".join(render_compact(r) for r in result.results) or "none found"
+
+    raise TypeError(f"Cannot render {type(result).__name__}")
+
+
+_RESULT_TYPES = {
+    "get_weather": WeatherResult,
+    "compare_weather": WeatherComparison,
+    "find_destinations": DestinationsResult,
+    "search_places": PlacesResult,
+    "search_places_multi": MultiPlacesResult,
+}
+
+
+def coerce_result(tool_name: str, artifact):
+    """Return the typed result for a tool artifact, or None if there isn't one.
+
+    Accepts both live dataclasses and the plain dicts a checkpointer returns.
+    """
+    if artifact is None or is_dataclass(artifact):
+        return artifact
+    if not isinstance(artifact, dict):
+        return None
+    if artifact.get("error"):
+        return ToolError(message=artifact.get("message", ""))
+
+    cls = _RESULT_TYPES.get(tool_name)
+    if cls is None:
+        return None
+    data = dict(artifact)
+    if cls is PlacesResult:
+        data["places"] = [p if isinstance(p, Place) else Place(**p) for p in data.get("places", [])]
+    elif cls is DestinationsResult:
+        data["matches"] = [m if isinstance(m, DestinationMatch) else DestinationMatch(**m) for m in data.get("matches", [])]
+    elif cls is MultiPlacesResult:
+        data["results"] = [coerce_result("search_places", r) for r in data.get("results", [])]
+    elif cls is WeatherComparison:
+        data["rows"] = [r if isinstance(r, WeatherResult) else WeatherResult(**r) for r in data.get("rows", [])]
+    return cls(**data)
+
+
+def to_dict(result) -> dict | None:
+    """JSON-friendly form of a result."""
+    return asdict(result) if result is not None else None
@@ -0,0 +1,82 @@
+"""Request coalescing ("single-flight") for upstream lookups.
+
+When several sessions miss the cache for the same key at once (a trending
+city, say), only the first caller runs the fetch. The others wait for that
+same in-flight call and get its result, or its exception. Every call is
+tracked on the shared HTTP loop from tools/http.py, so callers on any event
+loop, and sync callers going through run_sync(), coalesce with each other.
+
+Cancelling one waiter doesn't affect the others. When every waiter has gone
+away, the upstream call is cancelled too.
+
+Results are shared between waiters and must not be mutated.
+"""
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from tools.http import on_http_loop
+
+T = TypeVar("T")
+
+_flights: dict[str, "SingleFlight"] = {}
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share it."""
+
+    def __init__(self, name: str):
+        self.name = name
+        # Only touched on the HTTP loop, so no lock is needed.
+        self._calls: dict[Hashable, _Call] = {}
+        self._stats = {"calls": 0, "coalesced": 0}
+        _flights[name] = self
+
+    async def call(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await `fn()`, or the call already in flight for `key`."""
+        return await on_http_loop(self._call(key, fn))
+
+    async def _call(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda task: self._finished(key, call))
+            self._stats["calls"] += 1
+        else:
+            self._stats["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            # shield: a cancelled waiter must not cancel the others' call.
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every waiter was cancelled; nobody needs the result any more.
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _finished(self, key: Hashable, call: _Call):
+        self._forget(key, call)
+        if not call.task.cancelled():
+            call.task.exception()  # Retrieved, even if every waiter was cancelled.
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        """Upstream calls made, callers that joined one already in flight, and calls in flight now."""
+        return {**self._stats, "in_flight": len(self._calls)}
+
+
+def singleflight_stats() -> dict:
+    """stats() of every SingleFlight, by name."""
+    return {name: flight.stats() for name, flight in list(_flights.items())}
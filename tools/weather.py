@@ -1,18 +1,77 @@
-import requests
-from langchain.tools import tool
+import asyncio
+import calendar
+from typing import Literal
 
-from config import OPEN_METEO_GEOCODING_URL
+from langchain_core.tools import StructuredTool
+
+from config import (
+    OPEN_METEO_GEOCODING_URL,
+    GEOCODE_CACHE_SIZE,
+    GEOCODE_CACHE_TTL,
+    GEOCODE_NEGATIVE_CACHE_TTL,
+    CLIMATE_YEAR,
+    CLIMATE_GRID_DEG,
+    CLIMATE_CACHE_SIZE,
+    CLIMATE_CACHE_TTL,
+    COMPARE_MAX_CITIES,
+)
+from tools.cache import MISSING, TieredCache, normalize_key
+from tools.http import UpstreamError, aget_json, run_sync
+from tools.singleflight import SingleFlight
+from tools.results import ToolError, WeatherComparison, WeatherResult, render
 
 CLIMATE_API_URL = "https://climate-api.open-meteo.com/v1/climate"
 CLIMATE_MODEL = "EC_Earth3P_HR"
 
+_geocode_cache = TieredCache(
+    "geocode",
+    maxsize=GEOCODE_CACHE_SIZE,
+    ttl=GEOCODE_CACHE_TTL,
+    negative_ttl=GEOCODE_NEGATIVE_CACHE_TTL,
+)
+_geocode_flight = SingleFlight("geocode")
+
+
+def geocode_cache_stats() -> dict:
+    """Hit/miss counters for the geocoding cache."""
+    return _geocode_cache.stats()
+
+
+async def _ageocode_city(city: str, country: str | None = None) -> dict:
+    """Resolve a city name to coordinates, served from the geocoding cache when possible.
+
+    Unknown cities are cached too, so repeated typos don't hit the API again.
+    Network errors are not cached and surface as UpstreamError. Concurrent
+    misses for the same city share one request.
+    """
+    key = normalize_key(city, country)
+    cached = await _geocode_cache.aget(key)
+    if cached is None:
+        raise ValueError(f"City '{city}' not found. Please check the spelling.")
+    if cached is not MISSING:
+        return dict(cached)
+
+    async def fetch():
+        try:
+            geo = await _afetch_geocode(city, country)
+        except ValueError:
+            await _geocode_cache.aset(key, None)
+            raise
+        await _geocode_cache.aset(key, geo)
+        return geo
+
+    return dict(await _geocode_flight.call(key, fetch))
+
 
 def _geocode_city(city: str, country: str | None = None) -> dict:
+    """Blocking variant of _ageocode_city()."""
+    return run_sync(_ageocode_city(city, country))
+
+
+async def _afetch_geocode(city: str, country: str | None = None) -> dict:
     """Resolve a city name to coordinates using Open-Meteo geocoding API."""
     params = {"name": city, "count": 5, "language": "en", "format": "json"}
-    resp = requests.get(OPEN_METEO_GEOCODING_URL, params=params, timeout=10)
-    resp.raise_for_status()
-    data = resp.json()
+    data = await aget_json(OPEN_METEO_GEOCODING_URL, params=params)
 
     if "results" not in data or not data["results"]:
         raise ValueError(f"City '{city}' not found. Please check the spelling.")
@@ -41,71 +100,340 @@ def validate_city(city: str, country: str | None = None) -> dict | None:
     """Validate that a city exists. Returns geocoding result or None."""
     try:
         return _geocode_city(city, country)
-    except (ValueError, requests.RequestException):
+    except (ValueError, UpstreamError):
         return None
 
 
-@tool
-def get_weather(city: str, country: str, month: int) -> str:
-    """Get average climate data for a city in a specific month.
+async def avalidate_city(city: str, country: str | None = None) -> dict | None:
+    """Async variant of validate_city()."""
+    try:
+        return await _ageocode_city(city, country)
+    except (ValueError, UpstreamError):
+        return None
+
+
+CLIMATE_DAILY_VARS = "temperature_2m_mean,temperature_2m_max,temperature_2m_min,precipitation_sum,snowfall_sum"
+
+# Destinations we expect most users to ask about, used to pre-warm the climate store.
+POPULAR_DESTINATIONS = [
+    ("Barcelona", "Spain"), ("Lisbon", "Portugal"), ("Paris", "France"),
+    ("Rome", "Italy"), ("London", "United Kingdom"), ("Amsterdam", "Netherlands"),
+    ("Athens", "Greece"), ("Dubai", "United Arab Emirates"), ("Bangkok", "Thailand"),
+    ("Phuket", "Thailand"), ("Tokyo", "Japan"), ("New York", "United States"),
+    ("Cancún", "Mexico"), ("Dubrovnik", "Croatia"), ("Faro", "Portugal"),
+    ("Heraklion", "Greece"), ("Denpasar", "Indonesia"), ("Marrakesh", "Morocco"),
+    ("Málaga", "Spain"), ("Innsbruck", "Austria"), ("Zermatt", "Switzerland"),
+    ("Niseko", "Japan"), ("Bansko", "Bulgaria"), ("Reykjavik", "Iceland"),
+    ("Istanbul", "Turkey"), ("Prague", "Czechia"), ("Budapest", "Hungary"),
+    ("Berlin", "Germany"), ("Singapore", "Singapore"), ("Sydney", "Australia"),
+]
+
+# Namespaced by year, so changing CLIMATE_YEAR never serves another year's summaries.
+_climate_cache = TieredCache(
+    f"climate-{CLIMATE_YEAR}",
+    maxsize=CLIMATE_CACHE_SIZE,
+    ttl=CLIMATE_CACHE_TTL,
+)
+_climate_flight = SingleFlight("climate")
+
+
+def climate_cache_stats() -> dict:
+    """Hit/miss counters for the store of CLIMATE_YEAR monthly summaries."""
+    return _climate_cache.stats()
+
+
+def _grid_cell(latitude: float, longitude: float) -> tuple[float, float]:
+    """Snap coordinates to the centre of their CLIMATE_GRID_DEG grid cell."""
+    lat = round(round(latitude / CLIMATE_GRID_DEG) * CLIMATE_GRID_DEG, 4)
+    lon = round(round(longitude / CLIMATE_GRID_DEG) * CLIMATE_GRID_DEG, 4)
+    return lat, lon
+
+
+def _climate_key(lat: float, lon: float, month: int) -> str:
+    return f"{lat:.4f},{lon:.4f}:{month:02d}"
+
+
+def _summarize_daily(daily: dict, indices: list[int]) -> dict:
+    """Reduce daily climate series (restricted to `indices`) to one monthly summary."""
+    def pick(var):
+        values = daily.get(var, [])
+        return [values[i] for i in indices if i < len(values) and values[i] is not None]
+
+    temps_mean = pick("temperature_2m_mean")
+    temps_max = pick("temperature_2m_max")
+    temps_min = pick("temperature_2m_min")
+    precip = pick("precipitation_sum")
+    snow = pick("snowfall_sum")
+
+    return {
+        "avg_temp": round(sum(temps_mean) / len(temps_mean), 1) if temps_mean else None,
+        "max_temp": round(max(temps_max), 1) if temps_max else None,
+        "min_temp": round(min(temps_min), 1) if temps_min else None,
+        "total_precip": round(sum(precip), 1) if precip else None,
+        "total_snow": round(sum(snow), 1) if snow else None,
+    }
+
+
+def _monthly_summaries(daily: dict, months: list[int]) -> dict[int, dict]:
+    by_month: dict[int, list[int]] = {m: [] for m in months}
+    for i, day in enumerate(daily.get("time", [])):
+        month = int(day[5:7])
+        if month in by_month:
+            by_month[month].append(i)
+    return {m: _summarize_daily(daily, idx) for m, idx in by_month.items()}
+
+
+async def _afetch_climate_summaries_multi(cells: list[tuple[float, float]], months: list[int]) -> list[dict[int, dict]]:
+    """Download the CLIMATE_YEAR daily series spanning `months` for several grid cells
+    in a single multi-coordinate request, and summarize each month per cell.
+    """
+    first, last = min(months), max(months)
+    last_day = calendar.monthrange(CLIMATE_YEAR, last)[1]
+    params = {
+        "latitude": ",".join(str(lat) for lat, _ in cells),
+        "longitude": ",".join(str(lon) for _, lon in cells),
+        "start_date": f"{CLIMATE_YEAR}-{first:02d}-01",
+        "end_date": f"{CLIMATE_YEAR}-{last:02d}-{last_day:02d}",
+        "models": CLIMATE_MODEL,
+        "daily": CLIMATE_DAILY_VARS,
+    }
+    data = await aget_json(CLIMATE_API_URL, params=params)
+    # A single coordinate comes back as one object, several as a list.
+    locations = data if isinstance(data, list) else [data]
+    if len(locations) != len(cells):
+        raise UpstreamError(f"Expected climate data for {len(cells)} locations, got {len(locations)}")
+    return [_monthly_summaries(location.get("daily", {}), months) for location in locations]
+
+
+async def _afetch_climate_summaries(lat: float, lon: float, months: list[int]) -> dict[int, dict]:
+    """Download the CLIMATE_YEAR daily series spanning `months` and summarize each month."""
+    return (await _afetch_climate_summaries_multi([(lat, lon)], months))[0]
+
+
+async def aget_climate_summary(latitude: float, longitude: float, month: int) -> dict:
+    """CLIMATE_YEAR summary of `month` for the grid cell containing the coordinates.
+
+    This is one model year, not a multi-year normal. Served from the climate store when present; otherwise fetched from the
+    Open-Meteo climate API and stored, one request for concurrent misses on
+    the same cell and month. Raises UpstreamError on API failure.
+    """
+    lat, lon = _grid_cell(latitude, longitude)
+    key = _climate_key(lat, lon, month)
+    cached = await _climate_cache.aget(key)
+    if cached is not MISSING and cached is not None:
+        return cached
+
+    async def fetch():
+        summary = (await _afetch_climate_summaries(lat, lon, [month]))[month]
+        await _climate_cache.aset(key, summary)
+        return summary
+
+    return await _climate_flight.call(key, fetch)
+
+
+def get_climate_summary(latitude: float, longitude: float, month: int) -> dict:
+    """Blocking variant of aget_climate_summary()."""
+    return run_sync(aget_climate_summary(latitude, longitude, month))
+
+
+async def _awarm_destination(city: str, country: str, months: list[int]) -> str:
+    try:
+        geo = await _ageocode_city(city, country)
+        lat, lon = _grid_cell(geo["latitude"], geo["longitude"])
+        keys = {m: _climate_key(lat, lon, m) for m in months}
+        missing = [m for m, k in keys.items() if await _climate_cache.aget(k) in (MISSING, None)]
+        if not missing:
+            return "skipped"
+        summaries = await _afetch_climate_summaries(lat, lon, missing)
+    except (ValueError, UpstreamError):
+        return "failed"
+    for month, summary in summaries.items():
+        await _climate_cache.aset(keys[month], summary)
+    return "warmed"
+
+
+async def awarm_climate_cache(top_n: int | None = None, destinations: list[tuple[str, str]] | None = None) -> dict:
+    """Precompute all twelve CLIMATE_YEAR monthly summaries for popular destinations.
+
+    Each destination costs one geocode plus one climate request covering the
+    whole year, and destinations are fetched concurrently. Cells that are
+    already fully cached are skipped.
+
+    Returns dict with counts: warmed, skipped, failed.
+    """
+    if destinations is None:
+        destinations = POPULAR_DESTINATIONS
+    if top_n is not None:
+        destinations = destinations[:top_n]
+
+    months = list(range(1, 13))
+    outcomes = await asyncio.gather(
+        *(_awarm_destination(city, country, months) for city, country in destinations)
+    )
+    counts = {"warmed": 0, "skipped": 0, "failed": 0}
+    for outcome in outcomes:
+        counts[outcome] += 1
+    return counts
+
+
+def warm_climate_cache(top_n: int | None = None, destinations: list[tuple[str, str]] | None = None) -> dict:
+    """Blocking variant of awarm_climate_cache()."""
+    return run_sync(awarm_climate_cache(top_n, destinations))
+
+
+async def aweather_result(city: str, country: str, month: int) -> WeatherResult | ToolError:
+    """Structured climate data for a city and month."""
+    try:
+        geo = await _ageocode_city(city, country)
+    except ValueError as e:
+        return ToolError(str(e))
+    except UpstreamError as e:
+        return ToolError(f"Weather API error for {city}: {e}")
+
+    try:
+        summary = await aget_climate_summary(geo["latitude"], geo["longitude"], month)
+    except UpstreamError as e:
+        return ToolError(f"Weather API error for {city}: {e}")
+
+    return WeatherResult(city=geo["name"], country=geo["country"], month=month, **summary)
+
+
+async def _aget_weather(city: str, country: str, month: int) -> tuple[str, WeatherResult | ToolError]:
+    result = await aweather_result(city, country, month)
+    return render(result), result
+
+
+def _get_weather(city: str, country: str, month: int) -> tuple[str, WeatherResult | ToolError]:
+    """Get climate data for a city in a specific month.
 
     Use this tool when you need to check weather conditions at a destination
     for a particular time of year. Returns temperature, precipitation, and
-    snowfall data to help evaluate if a destination is suitable.
+    snowfall for that month of a single model year (named in the result), not
+    a long-term average, to help evaluate if a destination is suitable.
 
     Args:
         city: The city name (e.g., "Innsbruck", "Barcelona", "Tokyo")
         country: The country name (e.g., "Austria", "Spain", "Japan")
         month: The month number (1-12, where 1=January, 12=December)
     """
-    try:
-        geo = _geocode_city(city, country)
-    except ValueError as e:
-        return str(e)
+    return run_sync(_aget_weather(city, country, month))
 
-    import calendar
-    last_day = calendar.monthrange(2024, month)[1]
-    start_date = f"2024-{month:02d}-01"
-    end_date = f"2024-{month:02d}-{last_day:02d}"
 
-    params = {
-        "latitude": geo["latitude"],
-        "longitude": geo["longitude"],
-        "start_date": start_date,
-        "end_date": end_date,
-        "models": CLIMATE_MODEL,
-        "daily": "temperature_2m_mean,temperature_2m_max,temperature_2m_min,precipitation_sum,snowfall_sum",
-    }
-    try:
-        resp = requests.get(CLIMATE_API_URL, params=params, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
-    except requests.RequestException as e:
-        return f"Weather API error for {city}: {e}"
-
-    daily = data.get("daily", {})
-    temps_mean = [t for t in daily.get("temperature_2m_mean", []) if t is not None]
-    temps_max = [t for t in daily.get("temperature_2m_max", []) if t is not None]
-    temps_min = [t for t in daily.get("temperature_2m_min", []) if t is not None]
-    precip = [p for p in daily.get("precipitation_sum", []) if p is not None]
-    snow = [s for s in daily.get("snowfall_sum", []) if s is not None]
-
-    avg_temp = round(sum(temps_mean) / len(temps_mean), 1) if temps_mean else "N/A"
-    max_temp = round(max(temps_max), 1) if temps_max else "N/A"
-    min_temp = round(min(temps_min), 1) if temps_min else "N/A"
-    total_precip = round(sum(precip), 1) if precip else "N/A"
-    total_snow = round(sum(snow), 1) if snow else "N/A"
-
-    month_names = [
-        "", "January", "February", "March", "April", "May", "June",
-        "July", "August", "September", "October", "November", "December",
-    ]
+get_weather = StructuredTool.from_function(
+    func=_get_weather,
+    coroutine=_aget_weather,
+    name="get_weather",
+    response_format="content_and_artifact",
+)
+
+
+# Sort keys for compare_weather; cities without the value sort last.
+_RANKINGS = {
+    "warmest": lambda r: (r.avg_temp is None, -(r.avg_temp or 0)),
+    "coolest": lambda r: (r.avg_temp is None, r.avg_temp or 0),
+    "driest": lambda r: (r.total_precip is None, r.total_precip or 0),
+    "snowiest": lambda r: (r.total_snow is None, -(r.total_snow or 0)),
+}
+
+
+def _split_city(entry: str) -> tuple[str, str | None]:
+    """"Lisbon, Portugal" -> ("Lisbon", "Portugal"); "Lisbon" -> ("Lisbon", None)."""
+    city, _, country = entry.rpartition(",")
+    if not city:
+        return country.strip(), None
+    return city.strip(), country.strip() or None
+
 
-    return (
-        f"Climate data for {geo['name']}, {geo['country']} in {month_names[month]}:\n"
-        f"  Average Temperature: {avg_temp}°C\n"
-        f"  Max Temperature: {max_temp}°C\n"
-        f"  Min Temperature: {min_temp}°C\n"
-        f"  Total Precipitation: {total_precip} mm\n"
-        f"  Total Snowfall: {total_snow} cm\n"
+async def acompare_result(cities: list[str], month: int, rank_by: str = "warmest") -> WeatherComparison | ToolError:
+    """Climate of several cities in one month, ranked.
+
+    Cities are geocoded concurrently. Grid cells missing from the climate
+    store are then fetched together in one multi-coordinate request.
+    """
+    if rank_by not in _RANKINGS:
+        return ToolError(f"Unknown ranking '{rank_by}'. Use one of: {', '.join(_RANKINGS)}.")
+    queries = [_split_city(entry) for entry in cities[:COMPARE_MAX_CITIES] if entry.strip()]
+    if not queries:
+        return ToolError("No cities to compare.")
+
+    geos = await asyncio.gather(
+        *(_ageocode_city(city, country) for city, country in queries), return_exceptions=True
     )
+    resolved, not_compared = {}, []
+    for (city, _), geo in zip(queries, geos):
+        if isinstance(geo, ValueError):
+            not_compared.append(f"{city} (not found)")
+        elif isinstance(geo, UpstreamError):
+            not_compared.append(f"{city} (weather API error: {geo})")
+        elif isinstance(geo, BaseException):
+            raise geo
+        else:
+            # The same city asked for twice (or two names for one place) is listed once.
+            resolved.setdefault(_grid_cell(geo["latitude"], geo["longitude"]), geo)
+
+    summaries, missing = {}, []
+    for cell in resolved:
+        cached = await _climate_cache.aget(_climate_key(*cell, month))
+        if cached is MISSING or cached is None:
+            missing.append(cell)
+        else:
+            summaries[cell] = cached
+    if missing:
+        async def fetch():
+            fetched = await _afetch_climate_summaries_multi(missing, [month])
+            for cell, by_month in zip(missing, fetched):
+                await _climate_cache.aset(_climate_key(*cell, month), by_month[month])
+            return fetched
+
+        try:
+            # Identical comparisons running at the same time share one request.
+            fetched = await _climate_flight.call((tuple(missing), month), fetch)
+        except UpstreamError as e:
+            fetched = []
+            not_compared.extend(
+                f"{geo['name']} (weather API error: {e})"
+                for cell, geo in resolved.items() if cell in missing
+            )
+        for cell, by_month in zip(missing, fetched):
+            summaries[cell] = by_month[month]
+
+    rows = [
+        WeatherResult(city=geo["name"], country=geo["country"], month=month, **summaries[cell])
+        for cell, geo in resolved.items() if cell in summaries
+    ]
+    if not rows:
+        return ToolError(f"Could not compare: {'; '.join(not_compared)}")
+    rows.sort(key=_RANKINGS[rank_by])
+    return WeatherComparison(month=month, rank_by=rank_by, rows=rows, not_compared=not_compared)
+
+
+async def _acompare_weather(cities: list[str], month: int, rank_by: str = "warmest") -> tuple[str, WeatherComparison | ToolError]:
+    result = await acompare_result(cities, month, rank_by)
+    return render(result), result
+
+
+def _compare_weather(
+    cities: list[str],
+    month: int,
+    rank_by: Literal["warmest", "coolest", "driest", "snowiest"] = "warmest",
+) -> tuple[str, WeatherComparison | ToolError]:
+    """Compare the climate of several cities in the same month, as one ranked table.
+
+    Use this instead of several get_weather calls when weighing candidate
+    destinations against each other. Like get_weather, the figures are for one
+    model year (named in the result), not long-term averages.
+
+    Args:
+        cities: Up to 8 cities as "City, Country" (e.g. ["Faro, Portugal", "Málaga, Spain"])
+        month: The month number (1-12, where 1=January, 12=December)
+        rank_by: Order of the table: "warmest", "coolest", "driest" or "snowiest"
+    """
+    return run_sync(_acompare_weather(cities, month, rank_by))
+
+
+compare_weather = StructuredTool.from_function(
+    func=_compare_weather,
+    coroutine=_acompare_weather,
+    name="compare_weather",
+    response_format="content_and_artifact",
+)
@@ -1,6 +1,8 @@
 import json
 import streamlit as st
 
+from tools.results import to_dict
+
 
 def render_tool_trace(tool_calls: list[dict]):
     """Render expandable tool call trace in the chat."""
@@ -10,18 +12,22 @@ def render_tool_trace(tool_calls: list[dict]):
     with st.expander("View tool calls", expanded=False):
         for tc in tool_calls:
             name = tc.get("name", "unknown")
+            inp = tc.get("input", {})
             try:
-                inp = json.loads(tc.get("input", "{}"))
-                inp_str = json.dumps(inp, indent=2)
+                inp_str = json.dumps(json.loads(inp) if isinstance(inp, str) else inp, indent=2)
             except (json.JSONDecodeError, TypeError):
-                inp_str = tc.get("input", "")
-
-            output = tc.get("output", "")
-            preview = output[:400] + "..." if len(output) > 400 else output
+                inp_str = str(inp)
 
             st.markdown(f"**{name}**")
             st.code(f"Input: {inp_str}", language="json")
-            st.code(f"Output: {preview}", language="text")
+
+            data = tc.get("data")
+            if data is not None:
+                st.json(to_dict(data), expanded=False)
+            else:
+                output = tc.get("output", "")
+                preview = output[:400] + "..." if len(output) > 400 else output
+                st.code(f"Output: {preview}", language="text")
             st.divider()
 
 
@@ -43,3 +49,35 @@ def render_supervisor_badge(supervisor: dict):
             f'<span class="supervisor-badge supervisor-fail">✗ Flagged — {reason}</span>',
             unsafe_allow_html=True,
         )
+
+
+def render_streaming_response(events) -> dict:
+    """Render stream_agent() events incrementally. Returns the final result dict."""
+    status = st.empty()
+    placeholder = st.empty()
+    text = ""
+    result = {}
+
+    for event in events:
+        kind = event["type"]
+        if kind == "token":
+            text += event["content"]
+            placeholder.markdown(text + "▌")
+        elif kind == "tool_call":
+            # Text streamed before a tool call is the model thinking out loud, not the answer.
+            text = ""
+            placeholder.empty()
+            status.caption(f"Using {event['name']}...")
+        elif kind == "response":
+            text = event["content"]
+            placeholder.markdown(text)
+        elif kind == "retry":
+            text = ""
+            placeholder.empty()
+            status.caption("Double-checking the answer...")
+        elif kind == "done":
+            result = event["result"]
+
+    status.empty()
+    placeholder.markdown(result.get("response", text))
+    return result
@@ -0,0 +1,175 @@
+"""Per-turn token accounting, broken down by what the prompt was spent on.
+
+Provider usage metadata only gives a total per model call. To attribute it,
+PromptAccountingMiddleware estimates (chars / 4) how much of each request was
+system prompt, tool schemas, earlier history, the current turn and its tool
+results, and stores that on the AI message. turn_usage() then splits each
+call's real input_tokens in those proportions.
+
+It also records the bytes of each request and how many of them are the
+static prefix (SYSTEM_PROMPT plus the tool schemas, identical for every user
+and turn). Alongside, it sums the prompt tokens the provider reported as
+served from its prompt cache.
+"""
+import json
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from history import DIGEST_ID, _text, estimate_tokens
+
+PROMPT_COMPONENTS = ("system_prompt", "tool_schemas", "history", "current_turn", "tool_results", "supervisor")
+
+_schemas: dict[str, dict] = {}
+_schema_bytes: dict[str, int] = {}
+
+
+def tool_schema(tool) -> dict:
+    """OpenAI-format schema of a tool, converted once per tool name.
+
+    The same dict is returned every time, so it serializes to the same bytes.
+    Schema dicts are passed through.
+    """
+    if isinstance(tool, dict):
+        return tool
+    if tool.name not in _schemas:
+        _schemas[tool.name] = convert_to_openai_tool(tool)
+    return _schemas[tool.name]
+
+
+def _tool_schema_bytes(tool) -> int:
+    schema = tool_schema(tool)
+    name = schema.get("function", schema).get("name", "")
+    if name not in _schema_bytes:
+        _schema_bytes[name] = len(json.dumps(schema).encode())
+    return _schema_bytes[name]
+
+
+def _tool_schema_tokens(tool) -> int:
+    return _tool_schema_bytes(tool) // 4
+
+
+def prompt_breakdown(system_prompt: str | None, messages: list, tools: list) -> dict:
+    """Estimated tokens per component of one model request."""
+    start = 0
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].type == "human" and messages[i].id != DIGEST_ID:
+            start = i
+            break
+    current = messages[start:]
+    tool_results = [m for m in current if m.type == "tool"]
+    return {
+        "system_prompt": len(system_prompt or "") // 4,
+        "tool_schemas": sum(_tool_schema_tokens(t) for t in tools),
+        "history": estimate_tokens(messages[:start]),
+        "current_turn": estimate_tokens([m for m in current if m.type != "tool"]),
+        "tool_results": estimate_tokens(tool_results),
+    }
+
+
+def prompt_bytes(system_prompt: str | None, messages: list, tools: list, static_prefix: str = "") -> dict:
+    """{"total", "static"} bytes of one model request.
+
+    "static" counts the tool schemas plus `static_prefix` when the system
+    prompt starts with it, i.e. the part a provider-side prefix cache can reuse.
+    """
+    system_prompt = system_prompt or ""
+    schemas = sum(_tool_schema_bytes(t) for t in tools)
+    static = schemas
+    if static_prefix and system_prompt.startswith(static_prefix):
+        static += len(static_prefix.encode())
+    total = schemas + len(system_prompt.encode())
+    for msg in messages:
+        total += len(_text(msg).encode())
+        for tc in getattr(msg, "tool_calls", None) or []:
+            total += len(tc.get("name", "")) + len(str(tc.get("args", {})).encode())
+    return {"total": total, "static": static}
+
+
+def token_usage(message) -> dict:
+    """{"input_tokens", "output_tokens", "cached_tokens"} reported by the provider for one model call."""
+    meta = getattr(message, "usage_metadata", None) or {}
+    return {
+        "input_tokens": meta.get("input_tokens", 0),
+        "output_tokens": meta.get("output_tokens", 0),
+        "cached_tokens": (meta.get("input_token_details") or {}).get("cache_read") or 0,
+    }
+
+
+def empty_usage() -> dict:
+    return {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "model_calls": 0,
+        "prompt_breakdown": dict.fromkeys(PROMPT_COMPONENTS, 0),
+        "estimated": False,
+        "prompt_bytes": 0,
+        "static_prompt_bytes": 0,
+        "cached_tokens": 0,
+    }
+
+
+def turn_usage(messages: list) -> dict:
+    """Token usage of the agent's model calls among `messages` (one turn's new messages).
+
+    Calls without provider usage metadata are counted from the estimate, and
+    the result is flagged estimated=True.
+    """
+    usage = empty_usage()
+    parts = dict.fromkeys(PROMPT_COMPONENTS, 0.0)
+    for msg in messages:
+        if msg.type != "ai":
+            continue
+        usage["model_calls"] += 1
+        breakdown = msg.response_metadata.get("prompt_breakdown") or {}
+        estimated_total = sum(breakdown.values())
+        reported = token_usage(msg)
+        input_tokens, output_tokens = reported["input_tokens"], reported["output_tokens"]
+        if not input_tokens:
+            input_tokens, output_tokens = estimated_total, estimate_tokens([msg])
+            usage["estimated"] = True
+        usage["prompt_tokens"] += input_tokens
+        usage["completion_tokens"] += output_tokens
+        usage["cached_tokens"] += reported["cached_tokens"]
+        sizes = msg.response_metadata.get("prompt_bytes") or {}
+        usage["prompt_bytes"] += sizes.get("total", 0)
+        usage["static_prompt_bytes"] += sizes.get("static", 0)
+        if estimated_total:
+            for name, tokens in breakdown.items():
+                parts[name] += tokens * input_tokens / estimated_total
+    usage["prompt_breakdown"] = {name: round(tokens) for name, tokens in parts.items()}
+    return usage
+
+
+def add_usage(usage: dict, other: dict) -> dict:
+    """Sum of two usage dicts."""
+    return {
+        "prompt_tokens": usage["prompt_tokens"] + other["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"] + other["completion_tokens"],
+        "model_calls": usage["model_calls"] + other["model_calls"],
+        "prompt_breakdown": {
+            name: usage["prompt_breakdown"][name] + other["prompt_breakdown"][name]
+            for name in PROMPT_COMPONENTS
+        },
+        "estimated": usage["estimated"] or other["estimated"],
+        "prompt_bytes": usage["prompt_bytes"] + other["prompt_bytes"],
+        "static_prompt_bytes": usage["static_prompt_bytes"] + other["static_prompt_bytes"],
+        "cached_tokens": usage["cached_tokens"] + other["cached_tokens"],
+    }
+
+
+def prefix_cache_hit_rate(usage: dict) -> float:
+    """Share of the prompt tokens the provider served from its prompt cache."""
+    return usage["cached_tokens"] / usage["prompt_tokens"] if usage["prompt_tokens"] else 0.0
+
+
+def supervisor_usage(supervisor_result: dict) -> dict:
+    """Usage of the supervisor's LLM call, if it made one."""
+    usage = empty_usage()
+    reported = supervisor_result.get("usage")
+    if reported:
+        usage["prompt_tokens"] = reported["input_tokens"]
+        usage["completion_tokens"] = reported["output_tokens"]
+        usage["model_calls"] = 1
+        usage["prompt_breakdown"]["supervisor"] = reported["input_tokens"]
+        usage["cached_tokens"] = reported.get("cached_tokens", 0)
+    return usage